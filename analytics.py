@@ -0,0 +1,294 @@
+# analytics.py
+"""Per-conversation analytics accumulated while the backup streams.
+
+`ConversationActivity` folds each chunk of messages into a fixed-size
+summary per conversation (hour-of-week counts, length buckets, active days
+and reply-gap histograms), so memory grows with the number of
+conversations, not messages, and no second pass over the XML is needed.
+numpy is imported on first use to keep library imports cheap.
+"""
+
+import logging
+import math
+import re
+import time
+
+logger = logging.getLogger(__name__)
+
+# Message length buckets (characters); 160 is a single SMS segment
+LENGTH_BINS = [0, 10, 25, 50, 100, 160, 320, float("inf")]
+LENGTH_LABELS = [
+    "<10",
+    "10-24",
+    "25-49",
+    "50-99",
+    "100-159",
+    "160-319",
+    "320+",
+]
+DAY_NAMES = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+
+# Reply gaps are kept in log-spaced buckets from 1 second to ~3 years:
+# GAP_BUCKETS_PER_DECADE buckets per power of ten, so medians are within
+# about 6% of the exact value
+GAP_BUCKETS_PER_DECADE = 20
+GAP_DECADES = 8
+GAP_BUCKETS = GAP_BUCKETS_PER_DECADE * GAP_DECADES + 2
+# Reply medians are withheld for a conversation when more than this share
+# of its messages arrived dated before an earlier-read message of the thread
+OUT_OF_ORDER_LIMIT = 0.01
+# Lengths above this share one bucket when computing the median
+MAX_TRACKED_LENGTH = 4096
+# 1970-01-01 was a Thursday
+EPOCH_WEEKDAY = 3
+ACTIVE_RUN = re.compile("1+")
+
+
+class ConversationActivity:
+    """Fixed-size activity summary per conversation, filled in chunks.
+
+    Reply gaps are measured between consecutive messages in backup order
+    (SMS Backup & Restore writes messages in date order); each chunk is
+    sorted by date first, and a message dated before the previous one in
+    its conversation doesn't count as a reply. Such messages are counted,
+    and a conversation with more than OUT_OF_ORDER_LIMIT of them gets no
+    reply medians rather than wrong ones.
+    """
+
+    def __init__(self):
+        import numpy as np
+
+        self.ids = {}
+        self.keys = []
+        self.heatmap = np.zeros((0, 168), dtype=np.int32)
+        self.length_bins = np.zeros((0, len(LENGTH_LABELS)), dtype=np.int32)
+        # [conversation, sent, bucket]
+        self.reply_gaps = np.zeros((0, 2, GAP_BUCKETS), dtype=np.int32)
+        self.last_date = np.zeros(0, dtype=np.int64)
+        self.last_sent = np.zeros(0, dtype=np.int8)
+        self.out_of_order = np.zeros(0, dtype=np.int32)
+        # {length: count} and a bitset of active local days (bit 0 is the
+        # day in `first_day`) per conversation
+        self.lengths = []
+        self.first_day = []
+        self.days = []
+        self.messages = 0
+
+    def __len__(self):
+        return self.messages
+
+    def add(self, keys, dates, sent_flags, lengths):
+        """Fold a chunk of messages given as parallel sequences"""
+        import numpy as np
+
+        ids = self.ids
+        conv_ids = []
+        for key in keys:
+            conv_id = ids.get(key)
+            if conv_id is None:
+                conv_id = ids[key] = len(self.keys)
+                self.keys.append(key)
+                self.lengths.append({})
+                self.first_day.append(None)
+                self.days.append(0)
+            conv_ids.append(conv_id)
+        self._grow(len(self.keys))
+
+        conv = np.array(conv_ids, dtype=np.int64)
+        date = np.array(dates, dtype=np.int64)
+        sent = np.array(sent_flags, dtype=np.int8)
+        length = np.array(lengths, dtype=np.int64)
+        self.messages += len(conv)
+
+        local = date // 1000 + _utc_offsets(date)
+        day = local // 86400
+        hour_of_week = ((day + EPOCH_WEEKDAY) % 7) * 24 + (
+            local % 86400
+        ) // 3600
+        np.add.at(self.heatmap, (conv, hour_of_week), 1)
+
+        bucket = np.digitize(length, LENGTH_BINS[1:-1])
+        np.add.at(self.length_bins, (conv, bucket), 1)
+        pairs, counts = np.unique(
+            conv * (MAX_TRACKED_LENGTH + 1)
+            + np.minimum(length, MAX_TRACKED_LENGTH),
+            return_counts=True,
+        )
+        for pair, count in zip(pairs.tolist(), counts.tolist()):
+            conv_id, value = divmod(pair, MAX_TRACKED_LENGTH + 1)
+            histogram = self.lengths[conv_id]
+            histogram[value] = histogram.get(value, 0) + count
+
+        for pair in np.unique(conv * (1 << 32) + day).tolist():
+            conv_id, value = divmod(pair, 1 << 32)
+            first = self.first_day[conv_id]
+            if first is None or value < first:
+                # Re-base the bitset on the earlier day
+                self.days[conv_id] <<= 0 if first is None else first - value
+                self.first_day[conv_id] = first = value
+            self.days[conv_id] |= 1 << (value - first)
+
+        self._add_replies(np, conv, date, sent)
+
+    def _add_replies(self, np, conv, date, sent):
+        order = np.lexsort((date, conv))
+        conv, date, sent = conv[order], date[order], sent[order]
+        first = np.r_[True, conv[1:] != conv[:-1]]
+        prev_date = np.r_[0, date[:-1]]
+        prev_sent = np.r_[-1, sent[:-1]].astype(np.int8)
+        # The first message of each conversation in the chunk follows the
+        # last one seen in earlier chunks
+        prev_date[first] = self.last_date[conv[first]]
+        prev_sent[first] = self.last_sent[conv[first]]
+        # Messages older than one read in an earlier chunk can't be placed
+        np.add.at(self.out_of_order, conv, date < self.last_date[conv])
+
+        replies = (prev_sent >= 0) & (sent != prev_sent) & (date >= prev_date)
+        gap = (date[replies] - prev_date[replies]) / 1000
+        np.add.at(
+            self.reply_gaps,
+            (conv[replies], sent[replies], _gap_buckets(np, gap)),
+            1,
+        )
+
+        last = np.r_[conv[1:] != conv[:-1], True]
+        newer = date[last] >= self.last_date[conv[last]]
+        self.last_date[conv[last][newer]] = date[last][newer]
+        self.last_sent[conv[last][newer]] = sent[last][newer]
+
+    def _grow(self, size):
+        import numpy as np
+
+        current = len(self.last_date)
+        if size <= current:
+            return
+        size = max(size, current * 2, 16)
+        extra = size - current
+        self.heatmap = np.vstack(
+            [self.heatmap, np.zeros((extra, 168), dtype=np.int32)]
+        )
+        self.length_bins = np.vstack(
+            [
+                self.length_bins,
+                np.zeros((extra, len(LENGTH_LABELS)), dtype=np.int32),
+            ]
+        )
+        self.reply_gaps = np.concatenate(
+            [self.reply_gaps, np.zeros((extra, 2, GAP_BUCKETS), np.int32)]
+        )
+        self.last_date = np.r_[self.last_date, np.zeros(extra, np.int64)]
+        self.last_sent = np.r_[
+            self.last_sent, np.full(extra, -1, dtype=np.int8)
+        ]
+        self.out_of_order = np.r_[self.out_of_order, np.zeros(extra, np.int32)]
+
+    def summary(self):
+        """Compact analytics summary for every conversation.
+
+        Returns a dict keyed by conversation key, each value holding:
+            median_reply_sent: median seconds before you reply, or None
+            median_reply_received: median seconds before they reply, or None
+            out_of_order: messages dated before an earlier one in the
+                backup; above OUT_OF_ORDER_LIMIT both medians are None
+            hour_of_week: 168 message counts, Monday 00:00 first (local time)
+            longest_streak: most consecutive days with at least one message
+            longest_streak_start: first day of that streak (YYYY-MM-DD)
+            length_bins: message counts per LENGTH_LABELS bucket
+            median_length: median message length in characters
+        """
+        import numpy as np
+
+        logger.info(
+            f"Summarizing analytics for {self.messages:,} messages in "
+            f"{len(self.keys):,} conversations"
+        )
+        summary = {}
+        for conv_id, key in enumerate(self.keys):
+            streak, streak_start = _longest_streak(
+                self.days[conv_id], self.first_day[conv_id]
+            )
+            out_of_order = int(self.out_of_order[conv_id])
+            ordered = (
+                out_of_order
+                <= OUT_OF_ORDER_LIMIT * self.heatmap[conv_id].sum()
+            )
+            gaps = self.reply_gaps[conv_id]
+            summary[key] = {
+                "median_reply_sent": (
+                    _gap_median(gaps[1]) if ordered else None
+                ),
+                "median_reply_received": (
+                    _gap_median(gaps[0]) if ordered else None
+                ),
+                "out_of_order": out_of_order,
+                "hour_of_week": self.heatmap[conv_id].tolist(),
+                "longest_streak": streak,
+                "longest_streak_start": str(np.datetime64(streak_start, "D")),
+                "length_bins": self.length_bins[conv_id].tolist(),
+                "median_length": _median(self.lengths[conv_id]),
+            }
+        return summary
+
+
+def _utc_offsets(date):
+    """Local UTC offset in seconds for each millisecond timestamp"""
+    import numpy as np
+
+    low = time.localtime(int(date.min()) // 1000).tm_gmtoff
+    high = time.localtime(int(date.max()) // 1000).tm_gmtoff
+    if low == high:
+        return low
+    # The chunk spans a DST change; look each message up
+    return np.array(
+        [time.localtime(d // 1000).tm_gmtoff for d in date.tolist()],
+        dtype=np.int64,
+    )
+
+
+def _gap_buckets(np, seconds):
+    """Bucket 0 holds gaps under a second, the last one gaps over the range"""
+    with np.errstate(divide="ignore"):
+        scaled = np.floor(
+            np.log10(np.maximum(seconds, 1e-3)) * GAP_BUCKETS_PER_DECADE
+        )
+    return np.clip(scaled + 1, 0, GAP_BUCKETS - 1).astype(np.int64)
+
+
+def _gap_median(histogram):
+    """Median gap in seconds from a bucket histogram, or None"""
+    total = int(histogram.sum())
+    if not total:
+        return None
+    bucket = int((histogram.cumsum() * 2 >= total).argmax())
+    if bucket == 0:
+        return 0.0
+    # Geometric midpoint of the bucket's bounds
+    return float(10 ** ((bucket - 0.5) / GAP_BUCKETS_PER_DECADE))
+
+
+def _median(counts):
+    """Median of a {value: count} histogram, averaging the middle pair"""
+    total = sum(counts.values())
+    if not total:
+        return math.nan
+    middle = ((total - 1) // 2, total // 2)
+    values = []
+    seen = 0
+    for value in sorted(counts):
+        seen += counts[value]
+        while len(values) < 2 and seen > middle[len(values)]:
+            values.append(value)
+        if len(values) == 2:
+            break
+    return (values[0] + values[1]) / 2
+
+
+def _longest_streak(days, first_day):
+    """(length, first day) of the longest run of set bits in a day bitset"""
+    best = (0, 0)
+    # Bit 0 (the first day) is the last character of the binary string
+    for run in ACTIVE_RUN.finditer(bin(days)[:1:-1]):
+        length = run.end() - run.start()
+        if length > best[0]:
+            best = (length, first_day + run.start())
+    return best
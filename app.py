@@ -1,9 +1,5 @@
 import streamlit as st
 from logging_config import setup_logging
-from ui.instructions import show_instructions
-from ui.file_selector import show_file_selector
-from ui.processor import show_processor
-from ui.export import show_export_ui
 import logging
 
 logger = logging.getLogger(__name__)
@@ -14,6 +10,11 @@ def main():
     log_file = setup_logging()
     logger.info("Starting SMS Slicer application")
 
+    # UI modules are imported as each step is reached so the first render
+    # doesn't pay for pandas/altair or the analyzer
+    from ui.instructions import show_instructions
+    from ui.file_selector import show_file_selector
+
     # Main UI
     st.title("SMS Slicer")
     st.caption("Created by Max Ghenis (mghenis@gmail.com)")
@@ -25,12 +26,16 @@ def main():
         return
 
     # Processing
+    from ui.processor import show_processor
+
     conversations = show_processor(file_path)
     if not conversations:
         return
 
     # Export UI
     if hasattr(st.session_state, "conversation_df"):
+        from ui.export import show_export_ui
+
         show_export_ui(conversations, st.session_state.conversation_df)
 
 
@@ -0,0 +1,102 @@
+# cold_start.py
+"""Measure cold-start import time against a budget.
+
+Each target is imported in a fresh interpreter, so the numbers reflect what
+a new Streamlit session or a spawned worker process pays before doing any
+work. Run from the repository root:
+
+    python benchmarks/cold_start.py
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+# Import budgets in milliseconds, plus modules that must stay unloaded until
+# their feature is used
+TARGETS = {
+    "conversation": {
+        "budget_ms": 100,
+        "forbidden": ["streamlit", "pandas", "altair", "faker", "names"],
+    },
+    "app": {
+        "budget_ms": 750,
+        "forbidden": ["pandas", "altair", "faker", "names", "conversation"],
+    },
+}
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = (time.perf_counter() - start) * 1000
+print(json.dumps({{
+    "elapsed_ms": elapsed,
+    "loaded": [m for m in {forbidden!r} if m in sys.modules],
+}}))
+"""
+
+
+def measure(module, forbidden, runs):
+    """Import `module` in `runs` fresh interpreters and collect timings"""
+    timings = []
+    loaded = set()
+    for _ in range(runs):
+        result = subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                PROBE.format(module=module, forbidden=forbidden),
+            ],
+            cwd=REPO_ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        data = json.loads(result.stdout.strip().splitlines()[-1])
+        timings.append(data["elapsed_ms"])
+        loaded.update(data["loaded"])
+    return statistics.median(timings), sorted(loaded)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Check cold-start import time against a budget"
+    )
+    parser.add_argument(
+        "--runs",
+        type=int,
+        default=5,
+        help="Fresh interpreters per target (median is reported)",
+    )
+    parser.add_argument(
+        "--scale",
+        type=float,
+        default=1.0,
+        help="Multiply every budget, e.g. 2.0 on slow CI machines",
+    )
+    args = parser.parse_args()
+
+    failed = False
+    for module, target in TARGETS.items():
+        budget = target["budget_ms"] * args.scale
+        median_ms, loaded = measure(module, target["forbidden"], args.runs)
+        ok = median_ms <= budget and not loaded
+        failed |= not ok
+        print(
+            f"{'OK  ' if ok else 'FAIL'} {module}: {median_ms:.0f} ms "
+            f"(budget {budget:.0f} ms)"
+        )
+        if loaded:
+            print(f"     eagerly imported: {', '.join(loaded)}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
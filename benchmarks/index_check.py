@@ -0,0 +1,138 @@
+# index_check.py
+"""Check that date-bounded exports through the sparse index match a full scan.
+
+Writes a date-ordered synthetic backup in which about 1% of messages are
+MMS carrying multi-megabyte base64 attachments (the case where expat 2.6+
+defers parsing of large tokens), scans it once to build the index, then
+exports random contact/date-range pairs through the index and compares
+them with the matching lines of each contact's full-history export. Run from the repository root:
+
+    python benchmarks/index_check.py
+    python benchmarks/index_check.py --messages 20000 --ranges 200
+"""
+
+import argparse
+import random
+import sys
+import tempfile
+from datetime import date, timedelta
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+from conversation import ConversationAnalyzer  # noqa: E402
+
+CONTACTS = 10
+START_DATE = 1_700_000_000_000
+# One message roughly every 15 minutes
+STEP_MS = 15 * 60 * 1000
+NEWLINE = b"\n"
+
+
+def write_backup(path, num_messages, mms_rate, attachment_bytes, seed=0):
+    """Write a date-ordered backup with occasional large MMS"""
+    rng = random.Random(seed)
+    phones = [f"+1555111{i:04d}" for i in range(1, CONTACTS + 1)]
+    # Base64 alphabet only, so the attribute needs no escaping
+    attachment = ("QUJD" * (attachment_bytes // 4 + 1))[:attachment_bytes]
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("<?xml version='1.0' encoding='UTF-8' standalone='yes' ?>\n")
+        f.write(f'<smses count="{num_messages}">\n')
+        for i in range(num_messages):
+            address = rng.choice(phones)
+            msg_date = START_DATE + i * STEP_MS
+            body = "x" * rng.randint(5, 120)
+            if rng.random() < mms_rate:
+                box = rng.randint(1, 2)
+                f.write(
+                    f'  <mms date="{msg_date}" msg_box="{box}" '
+                    f'address="{address}" contact_name="C{address[-2:]}">'
+                    f'<parts><part ct="image/jpeg" data="{attachment}" />'
+                    f'<part ct="text/plain" text="{body}" /></parts>'
+                    f'<addrs><addr address="{address}" type="'
+                    f'{"151" if box == 2 else "137"}" /></addrs></mms>\n'
+                )
+            else:
+                f.write(
+                    f'  <sms protocol="0" address="{address}" '
+                    f'date="{msg_date}" type="{rng.randint(1, 2)}" '
+                    f'body="{body}" contact_name="C{address[-2:]}" />\n'
+                )
+        f.write("</smses>\n")
+    return phones
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare indexed and full-scan exports"
+    )
+    parser.add_argument("--messages", type=int, default=6000)
+    parser.add_argument("--mms-rate", type=float, default=0.01)
+    parser.add_argument(
+        "--attachment-mb",
+        type=float,
+        default=2.0,
+        help="Size of each MMS attachment",
+    )
+    parser.add_argument("--ranges", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    mismatches = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "sms-index.xml"
+        phones = write_backup(
+            path,
+            args.messages,
+            args.mms_rate,
+            int(args.attachment_mb * 1024 * 1024),
+            args.seed,
+        )
+        analyzer = ConversationAnalyzer(path, collect_analytics=False)
+        analyzer.stream_conversations(lambda *args: None)
+        if analyzer.sparse_index is None:
+            print("SKIP sparse index not built on this Python/expat")
+            sys.exit(0)
+        # Full-history exports (one full scan each); the synthetic bodies
+        # are single-line, so a range is the lines whose date falls in it
+        history = {}
+        for phone in phones:
+            with analyzer.export_conversation_buffer(
+                phone, None, None
+            ) as buffer:
+                history[phone] = buffer.read().splitlines(keepends=True)
+
+        first_day = date.fromtimestamp(START_DATE / 1000)
+        span_days = args.messages * STEP_MS // 86_400_000 + 1
+        for _ in range(args.ranges):
+            phone = rng.choice(phones)
+            start = first_day + timedelta(days=rng.randrange(span_days))
+            end = start + timedelta(days=rng.randint(0, 3))
+            with analyzer.export_conversation_buffer(
+                phone, start, end
+            ) as buffer:
+                indexed = buffer.read()
+            scanned = b"".join(
+                line
+                for line in history[phone]
+                if f"[{start}".encode() <= line[:11] <= f"[{end}".encode()
+            )
+            if indexed != scanned:
+                mismatches += 1
+                print(
+                    f"MISMATCH {phone} {start}..{end}: "
+                    f"{indexed.count(NEWLINE)} lines vs "
+                    f"{scanned.count(NEWLINE)}"
+                )
+
+    print(
+        f"{'OK  ' if not mismatches else 'FAIL'} {args.ranges - mismatches}"
+        f"/{args.ranges} indexed exports match the full scan"
+    )
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
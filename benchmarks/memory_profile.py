@@ -0,0 +1,162 @@
+# memory_profile.py
+"""Check that parsing memory stays flat as backups grow.
+
+Generates synthetic backups of increasing size, then runs the summary
+(`stream_conversations`, with analytics as the UI and service use it) and
+export (`export_conversation_buffer`) paths on each in a fresh interpreter,
+recording the tracemalloc peak and max RSS.
+
+Fails if the peak grows by more than the tolerance between the smallest and
+largest backup, or by more than `--max-bytes-per-message` per message
+between the two largest. The pipeline's queues hold a fixed number of rows
+but aren't full on the smallest backups, so most of the growth happens by
+100k messages; after that only the sparse index (32 bytes per 1,000
+messages) and the active-day bitsets (one bit per day per conversation)
+grow. Run from the repository root (the 10M run takes about 25 minutes):
+
+    python benchmarks/memory_profile.py
+    python benchmarks/memory_profile.py --sizes 10000 1000000 10000000
+"""
+
+import argparse
+import json
+import random
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+CONTACTS = 50
+# Exported contact with the same number of messages at every size, so the
+# export check measures the parser rather than the exported rows
+RARE_CONTACT = "+15550000000"
+RARE_MESSAGES = 100
+START_DATE = 1_600_000_000_000
+
+CHILD = """
+import json, resource, sys, tracemalloc
+sys.path.insert(0, {repo!r})
+from conversation import ConversationAnalyzer
+
+analyzer = ConversationAnalyzer({path!r})
+tracemalloc.start()
+if {mode!r} == "summary":
+    analyzer.stream_conversations(lambda *args: None)
+    analyzer.get_analytics()
+else:
+    analyzer.export_conversation_buffer({rare!r}, None, None).close()
+_, peak = tracemalloc.get_traced_memory()
+print(json.dumps({{
+    "peak": peak,
+    "maxrss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+}}))
+"""
+
+
+def write_backup(path, num_messages, seed=0):
+    """Write a synthetic backup without building it in memory"""
+    rng = random.Random(seed)
+    phones = [f"+1555{i:07d}" for i in range(1, CONTACTS + 1)]
+    rare_every = max(num_messages // RARE_MESSAGES, 1)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("<?xml version='1.0' encoding='UTF-8' standalone='yes' ?>\n")
+        f.write(f'<smses count="{num_messages}" backup_set="memory">\n')
+        lines = []
+        for i in range(num_messages):
+            address = (
+                RARE_CONTACT if i % rare_every == 0 else rng.choice(phones)
+            )
+            body = "x" * rng.randint(5, 120)
+            lines.append(
+                f'  <sms protocol="0" address="{address}" '
+                f'date="{START_DATE + i * 60_000}" type="{rng.randint(1, 2)}" '
+                f'body="{body}" read="1" status="-1" '
+                f'contact_name="Contact {address[-4:]}" />\n'
+            )
+            if len(lines) >= 10_000:
+                f.writelines(lines)
+                lines = []
+        f.writelines(lines)
+        f.write("</smses>\n")
+
+
+def measure(path, mode):
+    code = CHILD.format(
+        repo=str(REPO_ROOT), path=str(path), mode=mode, rare=RARE_CONTACT
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Check that parsing memory stays flat with file size"
+    )
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[10_000, 100_000, 1_000_000],
+        help="Message counts to generate (first and last are compared)",
+    )
+    parser.add_argument(
+        "--tolerance-mb",
+        type=float,
+        default=2.0,
+        help="Allowed growth of the tracemalloc peak",
+    )
+    parser.add_argument(
+        "--max-bytes-per-message",
+        type=float,
+        default=0.2,
+        help="Allowed peak growth per message between the two largest sizes",
+    )
+    args = parser.parse_args()
+
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp:
+        peaks = {"summary": [], "export": []}
+        for size in args.sizes:
+            path = Path(tmp) / f"sms-{size}.xml"
+            write_backup(path, size)
+            for mode in peaks:
+                stats = measure(path, mode)
+                peaks[mode].append(stats["peak"])
+                print(
+                    f"{mode:8} {size:>12,} messages: "
+                    f"peak {stats['peak'] / 2**20:7.2f} MB, "
+                    f"max RSS {stats['maxrss'] / 2**20:7.1f} MB"
+                )
+            path.unlink()
+
+    for mode, values in peaks.items():
+        growth = (values[-1] - values[0]) / 2**20
+        per_message = (
+            (values[-1] - values[-2]) / (args.sizes[-1] - args.sizes[-2])
+            if len(values) > 1
+            else 0.0
+        )
+        ok = (
+            growth <= args.tolerance_mb
+            and per_message <= args.max_bytes_per_message
+        )
+        failed |= not ok
+        print(
+            f"{'OK  ' if ok else 'FAIL'} {mode}: peak grew {growth:.2f} MB "
+            f"(tolerance {args.tolerance_mb:.1f} MB), "
+            f"{per_message:.3f} bytes/message at the largest sizes "
+            f"(limit {args.max_bytes_per_message:.2f})"
+        )
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
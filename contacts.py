@@ -0,0 +1,145 @@
+# contacts.py
+"""Shared contact names: string interning and one-time name resolution.
+
+Every message in a backup repeats its contact's name and address, and every
+exported row its type label. `StringPool` keeps one copy of each distinct
+string, and `NameResolver` decides the display name for each normalized
+number or thread key the first time a usable name is seen (or up front from
+a vCard export), so per-message processing only does a dict lookup.
+"""
+
+import logging
+import quopri
+import re
+from pathlib import Path
+from engine import normalize_number
+
+logger = logging.getLogger(__name__)
+
+UNKNOWN_NAME = "(Unknown)"
+UNESCAPED_SEMICOLON = re.compile(r"(?<!\\);")
+
+
+class StringPool:
+    """Hands out one shared instance per distinct string"""
+
+    def __init__(self):
+        self._strings = {}
+
+    def __call__(self, value):
+        return self._strings.setdefault(value, value)
+
+    def __len__(self):
+        return len(self._strings)
+
+
+class NameResolver:
+    """Best display name per key (normalized number or thread key).
+
+    Names loaded from a vCard (`contacts`) take precedence; otherwise the
+    first real contact_name seen for a key is kept and never re-checked.
+    """
+
+    def __init__(self, strings=None):
+        self.strings = strings if strings is not None else StringPool()
+        self.contacts = {}
+        self.names = {}
+
+    def reset(self):
+        """Forget names seen in backups, keeping the vCard"""
+        self.names = dict(self.contacts)
+
+    def resolve(self, key, contact_name):
+        """Name for `key`, taking `contact_name` if none is known yet"""
+        name = self.names.get(key)
+        if name is None and contact_name and contact_name != UNKNOWN_NAME:
+            name = self.names[key] = self.strings(contact_name)
+        return name or UNKNOWN_NAME
+
+    def name(self, key, default=UNKNOWN_NAME):
+        return self.names.get(key, default)
+
+    def contact(self, key, default=UNKNOWN_NAME):
+        """vCard name for `key`, ignoring names seen in backups"""
+        return self.contacts.get(key, default)
+
+    def load_vcard(self, path):
+        """Add names from a .vcf export, keyed by normalize_number.
+
+        Returns the number of phone numbers loaded.
+        """
+        loaded = 0
+        for name, numbers in read_vcards(path):
+            name = self.strings(name)
+            for number in numbers:
+                key = normalize_number(number)
+                if key:
+                    self.contacts[key] = self.names[key] = name
+                    loaded += 1
+        logger.info(f"Loaded {loaded:,} numbers from {Path(path).name}")
+        return loaded
+
+
+def read_vcards(path):
+    """Yield (name, [numbers]) for each card with a name and a number"""
+    name = None
+    numbers = []
+    for prop, params, value in _read_properties(path):
+        if prop == "BEGIN":
+            name = None
+            numbers = []
+        elif prop == "FN":
+            name = _decode(value, params) or name
+        elif prop == "N" and not name:
+            # Family;Given;Middle;Prefix;Suffix
+            parts = [
+                _decode(p, params) for p in UNESCAPED_SEMICOLON.split(value)
+            ]
+            name = " ".join(p for p in parts[1:2] + parts[:1] if p) or None
+        elif prop == "TEL":
+            numbers.append(value.strip())
+        elif prop == "END" and name and numbers:
+            yield name, numbers
+
+
+def _read_properties(path):
+    """(name, params, value) per unfolded content line"""
+    with open(path, encoding="utf-8", errors="replace") as f:
+        line = None
+        for raw in f:
+            raw = raw.rstrip("\r\n")
+            if raw[:1] in (" ", "\t") and line is not None:
+                # Folded continuation line
+                line += raw[1:]
+                continue
+            if line is not None and line.endswith("=") and "QUOTED" in line:
+                # Quoted-printable soft line break (vCard 2.1)
+                line = line[:-1] + raw
+                continue
+            if line:
+                yield _split_property(line)
+            line = raw
+        if line:
+            yield _split_property(line)
+
+
+def _split_property(line):
+    head, _, value = line.partition(":")
+    prop, *params = head.split(";")
+    # Drop group prefixes such as "item1.TEL"
+    prop = prop.rpartition(".")[2].upper()
+    return prop, [p.upper() for p in params], value
+
+
+def _decode(value, params):
+    if "ENCODING=QUOTED-PRINTABLE" in params:
+        value = quopri.decodestring(value.encode("ascii", "replace")).decode(
+            "utf-8", "replace"
+        )
+    return (
+        value.replace("\\,", ",")
+        .replace("\\;", ";")
+        .replace("\\n", " ")
+        .replace("\\\\", "\\")
+        .strip()
+    )
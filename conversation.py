@@ -1,110 +1,200 @@
 # conversation.py
-import xml.etree.ElementTree as ET
 from collections import defaultdict
 from datetime import datetime
-import time
 from pathlib import Path
-import streamlit as st
 import logging
+from analytics import ConversationActivity
+from contacts import UNKNOWN_NAME, NameResolver, StringPool
+from engine import (
+    MESSAGE_TAGS,
+    READ_SIZE,
+    TIMELY_ELEMENTS,
+    ElementHandler,
+    StreamingEngine,
+    iter_elements,
+    normalize_number,
+    read_message,
+    thread_key,
+)
+from preview import estimate_conversations
+from sparse_index import SparseIndex
+from exporter import (
+    RUN_BATCH_ROWS,
+    SORT_BUFFER_ROWS,
+    MessageSorter,
+    conversation_filename,
+    write_messages,
+    write_text_buffer,
+    write_zip_buffer,
+)
 
 logger = logging.getLogger(__name__)
 
 
+# Call log `type` values from SMS Backup & Restore
+CALL_TYPES = {
+    "1": "incoming",
+    "2": "outgoing",
+    "3": "missed",
+    "4": "voicemail",
+    "5": "rejected",
+    "6": "blocked",
+}
+
+
 class ConversationAnalyzer:
-    def __init__(self, file_path):
+    def __init__(
+        self,
+        file_path,
+        collect_analytics=True,
+        call_log_path=None,
+        engine_options=None,
+        contacts_path=None,
+    ):
         self.file_path = Path(file_path)
         self.file_size = self.file_path.stat().st_size
+        self.call_log_path = Path(call_log_path) if call_log_path else None
         logger.info(
             f"Initializing analyzer for {file_path} (size: {self.file_size / (1024*1024):.2f} MB)"
         )
+        self.collect_analytics = collect_analytics
+        self.contacts_path = contacts_path
+        # One copy of each repeated string, shared by the summary and
+        # export paths
+        self.strings = StringPool()
+        self._thread_keys = {}
+        # One display name per number or thread key
+        self.names = NameResolver(self.strings)
+        if contacts_path:
+            self.names.load_vcard(contacts_path)
+        self._reset_scan()
+        self.result = None
+        # Built during the first scan; lets date-bounded exports seek
+        self.sparse_index = None
+        # StreamingEngine tunables (read_size, buffer_count, queue_depth,
+        # chunk_size) and the per-stage throughput of the last scan
+        self.engine_options = engine_options or {}
+        self.stage_metrics = None
+
+    def _reset_scan(self):
+        """Fresh per-scan state, so an interrupted scan is never counted
+        twice when streaming starts again"""
         self.conversations = defaultdict(
             lambda: {
                 "count": 0,
                 "sent": 0,
                 "received": 0,
-                "contact_name": "(Unknown)",
+                "contact_name": UNKNOWN_NAME,
                 "first_date": None,
                 "last_date": None,
+                "address": None,
+                "participants": [],
             }
         )
+        self.names.reset()
+        # Threads are keyed by thread_key; the index maps each normalized
+        # number to every thread it takes part in, groups included
+        self.participant_index = defaultdict(set)
+        # Call totals keyed by normalize_number, joined onto conversations
+        self.calls = defaultdict(
+            lambda: {
+                "calls": 0,
+                "call_duration": 0,
+                "missed_calls": 0,
+                "first_date": None,
+                "last_date": None,
+                "address": None,
+            }
+        )
+        # Per-conversation activity summary filled during streaming, so
+        # analytics need no second pass and no per-message storage
+        self.activity = (
+            ConversationActivity() if self.collect_analytics else None
+        )
+        self.analytics = None
+
+    def preview_conversations(self, **kwargs):
+        """Estimate conversation counts in about a second by sampling"""
+        return estimate_conversations(self.file_path, **kwargs)
 
     def stream_conversations(self, progress_callback):
-        """Stream conversation data as it's processed"""
-        logger.info("Starting conversation streaming")
-        start_time = time.time()
-        context = ET.iterparse(self.file_path, events=("end",))
-        last_update = time.time()
-        update_interval = 1  # Update UI every second
-        total_bytes = 0
-        messages_processed = 0
+        """Stream conversation data as it's processed.
 
-        # Process in larger chunks for better performance
-        chunk_size = 1000  # Process 1000 messages before checking time
-        chunk = []
+        Conversations are keyed by thread_key, so a group thread is one
+        conversation whatever order its recipients are listed in. If a call
+        log was given it is streamed in the same run, and each one-to-one
+        conversation gains "calls", "call_duration" (seconds) and
+        "missed_calls" for the same normalized number.
+        """
+        # Streamlit reruns call this again; don't rescan (and double count)
+        if self.result is not None:
+            progress_callback(1.0, 0, 0, self.result)
+            return self.result
+
+        logger.info("Starting conversation streaming")
+        # A previous scan may have been interrupted part way (e.g. by a
+        # Streamlit rerun raising inside the progress callback)
+        self._reset_scan()
+        file_paths = [self.file_path]
+        handlers = [
+            ElementHandler(
+                MESSAGE_TAGS, self._extract_message, self._process_chunk
+            )
+        ]
+        if self.call_log_path is not None:
+            file_paths.append(self.call_log_path)
+            handlers.append(
+                ElementHandler(
+                    "call", self._extract_call, self._process_call_chunk
+                )
+            )
+        # Index offsets are only valid for the read size they were built
+        # with, and only if elements arrive with the chunk that ends them;
+        # without that, bounded exports fall back to a full scan
+        indexes = {}
+        sparse_index = None
+        if TIMELY_ELEMENTS:
+            sparse_index = indexes[self.file_path] = SparseIndex(
+                self.file_path,
+                read_size=self.engine_options.get("read_size", READ_SIZE),
+            )
+        else:
+            logger.warning(
+                "This Python can't flush expat's deferred parsing; "
+                "date-bounded exports will scan the whole backup"
+            )
+        engine = StreamingEngine(
+            file_paths,
+            handlers,
+            indexes=indexes,
+            **self.engine_options,
+        )
 
         try:
             logger.debug("Beginning XML parsing")
-            for event, elem in context:
-                if elem.tag == "sms":
-                    # Process message
-                    address = elem.get("address")
-                    contact_name = elem.get("contact_name", "")
-                    msg_date = int(elem.get("date", 0))
-                    msg_type = (
-                        "sent" if elem.get("type") == "2" else "received"
-                    )
-
-                    # Add to current chunk
-                    chunk.append((address, contact_name, msg_date, msg_type))
-                    elem_size = len(ET.tostring(elem))
-                    total_bytes += elem_size
-
-                    # Process chunk if it's full
-                    if len(chunk) >= chunk_size:
-                        self._process_chunk(chunk)
-                        messages_processed += len(chunk)
-                        chunk = []
-
-                        # Update progress based on time interval
-                        current_time = time.time()
-                        if current_time - last_update >= update_interval:
-                            elapsed = current_time - start_time
-                            if elapsed > 0:
-                                speed = total_bytes / (1024 * 1024 * elapsed)
-                                eta = (
-                                    (self.file_size - total_bytes)
-                                    / (speed * 1024 * 1024)
-                                    if speed > 0
-                                    else 0
-                                )
-                                progress = min(
-                                    total_bytes / self.file_size, 1.0
-                                )
-                                logger.debug(
-                                    f"Progress: {progress:.1%}, Speed: {speed:.1f} MB/s, "
-                                    f"ETA: {eta:.0f}s, Messages: {messages_processed:,}"
-                                )
-                                progress_callback(
-                                    progress,
-                                    speed,
-                                    eta,
-                                    dict(self.conversations),
-                                )
-                                last_update = current_time
-
-                    elem.clear()
-
-            # Process any remaining messages
-            if chunk:
-                self._process_chunk(chunk)
+            counts = engine.run(
+                lambda progress, speed, eta: progress_callback(
+                    progress, speed, eta, self._snapshot()
+                )
+            )
 
             # Final update
-            progress_callback(1.0, 0, 0, dict(self.conversations))
+            self.sparse_index = sparse_index
+            self.stage_metrics = {
+                name: stage.as_dict() for name, stage in engine.metrics.items()
+            }
+            conversations = self.result = self._snapshot()
+            progress_callback(1.0, 0, 0, conversations)
             logger.info(
                 f"Processing complete. Found {len(self.conversations)} conversations, "
-                f"processed {messages_processed:,} messages"
+                f"processed {counts['sms'] + counts['mms']:,} messages"
+                + (
+                    f" and {counts['call']:,} calls"
+                    if "call" in counts
+                    else ""
+                )
             )
-            return dict(self.conversations)
+            return conversations
 
         except Exception as e:
             logger.error(
@@ -112,25 +202,146 @@ class ConversationAnalyzer:
             )
             raise e
 
+    def _snapshot(self):
+        """Current conversations, with call totals joined on when present.
+
+        Numbers that only appear in the call log are included too, with
+        zero message counts and the date range of their calls.
+        """
+        if not self.calls:
+            return dict(self.conversations)
+        joined = {}
+        for key, conv in self.conversations.items():
+            # Group thread keys contain "~" and never match a call number
+            calls = self.calls.get(key)
+            joined[key] = (
+                conv
+                if calls is None
+                else {
+                    **conv,
+                    # The call log may name a contact the messages don't
+                    "contact_name": self.names.name(key),
+                    "calls": calls["calls"],
+                    "call_duration": calls["call_duration"],
+                    "missed_calls": calls["missed_calls"],
+                }
+            )
+        for key, calls in self.calls.items():
+            if key in joined:
+                continue
+            joined[key] = {
+                "count": 0,
+                "sent": 0,
+                "received": 0,
+                "contact_name": self.names.name(key),
+                "first_date": calls["first_date"],
+                "last_date": calls["last_date"],
+                "address": calls["address"],
+                "participants": [key],
+                "calls": calls["calls"],
+                "call_duration": calls["call_duration"],
+                "missed_calls": calls["missed_calls"],
+            }
+        return joined
+
+    def threads_with(self, number):
+        """Keys of every thread, one-to-one or group, including `number`"""
+        return sorted(self.participant_index.get(normalize_number(number), ()))
+
+    def _thread_key(self, address):
+        """thread_key, cached per raw address string"""
+        key = self._thread_keys.get(address)
+        if key is None:
+            key = self._thread_keys[address] = self.strings(
+                thread_key(address)
+            )
+        return key
+
+    def _extract_message(self, elem):
+        address, contact_name, msg_date, msg_type, body, _ = read_message(elem)
+        return (
+            self._thread_key(address),
+            address,
+            contact_name,
+            msg_date,
+            msg_type,
+            len(body),
+        )
+
+    @staticmethod
+    def _extract_call(elem):
+        return (
+            elem.get("number"),
+            elem.get("contact_name", ""),
+            int(elem.get("date", 0)),
+            int(elem.get("duration") or 0),
+            CALL_TYPES.get(elem.get("type"), "unknown"),
+        )
+
+    def _process_call_chunk(self, chunk):
+        """Aggregate a chunk of call log entries by normalized number"""
+        names = self.names.names
+        for number, contact_name, call_date, duration, call_type in chunk:
+            key = normalize_number(number)
+            stats = self.calls[key]
+            if not stats["calls"]:
+                stats["address"] = self.strings(number)
+                stats["first_date"] = stats["last_date"] = call_date
+            elif call_date < stats["first_date"]:
+                stats["first_date"] = call_date
+            elif call_date > stats["last_date"]:
+                stats["last_date"] = call_date
+            stats["calls"] += 1
+            stats["call_duration"] += duration
+            if call_type == "missed":
+                stats["missed_calls"] += 1
+            if contact_name and key not in names:
+                self.names.resolve(key, contact_name)
+
     def _process_chunk(self, chunk):
         """Process a chunk of messages efficiently"""
-        for address, contact_name, msg_date, msg_type in chunk:
-            conv = self.conversations[address]
+        if self.activity is not None:
+            keys, _, _, dates, types, lengths = zip(*chunk)
+            self.activity.add(
+                keys,
+                dates,
+                [msg_type == "sent" for msg_type in types],
+                lengths,
+            )
+
+        for key, address, contact_name, msg_date, msg_type, _ in chunk:
+            conv = self.conversations[key]
+            if not conv["count"]:
+                # First message of this thread: index its participants
+                conv["address"] = self.strings(address)
+                conv["participants"] = [
+                    self.strings(number) for number in key.split("~")
+                ]
+                for number in conv["participants"]:
+                    self.participant_index[number].add(key)
+                conv["contact_name"] = self.names.resolve(key, contact_name)
+            elif contact_name and conv["contact_name"] == UNKNOWN_NAME:
+                # Resolved once per thread, not re-checked per message
+                conv["contact_name"] = self.names.resolve(key, contact_name)
             conv["count"] += 1
             conv[msg_type] += 1
 
-            # Update contact name if it's not already set
-            if not conv["contact_name"] or conv["contact_name"] == "(Unknown)":
-                conv["contact_name"] = (
-                    contact_name if contact_name else "(Unknown)"
-                )
-
             # Update date range
             if conv["first_date"] is None or msg_date < conv["first_date"]:
                 conv["first_date"] = msg_date
             if conv["last_date"] is None or msg_date > conv["last_date"]:
                 conv["last_date"] = msg_date
 
+    def get_analytics(self):
+        """Per-conversation analytics, computed once after streaming"""
+        if self.analytics is None:
+            if self.activity is None:
+                raise ValueError(
+                    "Analytics were not collected for this analyzer"
+                )
+            self.analytics = self.activity.summary()
+        return self.analytics
+
     def export_conversation(
         self,
         phone,
@@ -139,71 +350,134 @@ class ConversationAnalyzer:
         output_format="txt",
         output_path=None,
     ):
-        """Export a specific conversation within date range"""
-        start_timestamp = int(
-            datetime.combine(start_date, datetime.min.time()).timestamp()
-            * 1000
-        )
-        end_timestamp = int(
-            datetime.combine(end_date, datetime.max.time()).timestamp() * 1000
-        )
-
+        """Export a conversation (number or thread key) within date range"""
         if output_path is None:
-            safe_phone = "".join(c if c.isalnum() else "_" for c in phone)
             output_path = Path(
-                f"conversation_{safe_phone}_{start_date}_{end_date}.{output_format}"
+                conversation_filename(
+                    phone, start_date, end_date, output_format
+                )
             )
 
-        messages = []
-        context = ET.iterparse(self.file_path, events=("end",))
+        try:
+            sorter = self._collect_messages([phone], start_date, end_date)[
+                phone
+            ]
+            with open(output_path, "w", newline="", encoding="utf-8") as f:
+                write_messages(f, sorter, output_format)
+            return output_path
+
+        except Exception as e:
+            logger.error(
+                f"Error exporting conversation: {str(e)}", exc_info=True
+            )
+            raise e
 
+    def export_conversation_buffer(
+        self, phone, start_date, end_date, output_format="txt"
+    ):
+        """Export a conversation into a spooled in-memory buffer"""
         try:
-            for event, elem in context:
-                if elem.tag == "sms":
-                    msg_date = int(elem.get("date", 0))
-                    if (
-                        elem.get("address") == phone
-                        and start_timestamp <= msg_date <= end_timestamp
-                    ):
-                        # Convert timestamp to proper ISO format
-                        dt = datetime.fromtimestamp(msg_date / 1000)
-                        formatted_date = dt.strftime("%Y-%m-%d %H:%M:%S")
-
-                        msg = {
-                            "timestamp": formatted_date,
-                            "type": (
-                                "sent"
-                                if elem.get("type") == "2"
-                                else "received"
-                            ),
-                            "body": elem.get("body", ""),
-                            "raw_timestamp": msg_date,  # Keep raw timestamp for sorting
-                        }
-                        messages.append(msg)
-                elem.clear()
-
-            # Sort by raw timestamp
-            messages.sort(key=lambda x: x["raw_timestamp"])
-
-            if output_format == "txt":
-                with open(output_path, "w", encoding="utf-8") as f:
-                    for msg in messages:
-                        f.write(
-                            f"[{msg['timestamp']}] {msg['type']}: {msg['body']}\n"
-                        )
-            else:  # CSV format
-                import csv
-
-                with open(output_path, "w", newline="", encoding="utf-8") as f:
-                    writer = csv.writer(f)
-                    writer.writerow(["Timestamp", "Type", "Message"])
-                    for msg in messages:
-                        writer.writerow(
-                            [msg["timestamp"], msg["type"], msg["body"]]
-                        )
+            sorter = self._collect_messages([phone], start_date, end_date)[
+                phone
+            ]
+            return write_text_buffer(sorter, output_format)
+        except Exception as e:
+            logger.error(
+                f"Error exporting conversation: {str(e)}", exc_info=True
+            )
+            raise e
 
-            return output_path
+    def export_conversations_zip(
+        self, phones, start_date=None, end_date=None, output_format="txt"
+    ):
+        """Export several conversations into a zip in a single pass.
 
+        Dates of None leave that end of the range open.
+        """
+        try:
+            max_rows = max(
+                RUN_BATCH_ROWS, SORT_BUFFER_ROWS // max(len(phones), 1)
+            )
+            sorters = self._collect_messages(
+                phones, start_date, end_date, max_rows
+            )
+            entries = {
+                conversation_filename(
+                    phone, start_date, end_date, output_format
+                ): sorter
+                for phone, sorter in sorters.items()
+            }
+            return write_zip_buffer(entries, output_format)
         except Exception as e:
-            st.error(f"Error exporting conversation: {str(e)}")
+            logger.error(
+                f"Error exporting conversations: {str(e)}", exc_info=True
+            )
             raise e
+
+    def _collect_messages(
+        self, phones, start_date, end_date, max_rows=SORT_BUFFER_ROWS
+    ):
+        """Scan once, sorting each conversation's matching messages"""
+        start_timestamp = (
+            int(
+                datetime.combine(start_date, datetime.min.time()).timestamp()
+                * 1000
+            )
+            if start_date is not None
+            else float("-inf")
+        )
+        end_timestamp = (
+            int(
+                datetime.combine(end_date, datetime.max.time()).timestamp()
+                * 1000
+            )
+            if end_date is not None
+            else float("inf")
+        )
+
+        sorters = {phone: MessageSorter(max_rows) for phone in phones}
+        # Accept raw numbers as well as thread keys
+        by_key = {self._thread_key(phone): sorters[phone] for phone in phones}
+        # "received from ..." labels, built once per group sender from the
+        # vCard only, so they don't depend on what earlier scans have seen
+        sender_labels = {}
+        elements = self._iter_messages(
+            start_timestamp,
+            end_timestamp,
+            bounded=start_date is not None or end_date is not None,
+        )
+        for elem in elements:
+            address, _, msg_date, msg_type, body, sender = read_message(elem)
+            key = self._thread_key(address)
+            sorter = by_key.get(key)
+            if sorter is not None and (
+                start_timestamp <= msg_date <= end_timestamp
+            ):
+                # Name the sender of incoming group messages
+                if sender and msg_type == "received" and "~" in key:
+                    msg_type = sender_labels.get(sender)
+                    if msg_type is None:
+                        msg_type = sender_labels[sender] = self.strings(
+                            "received from "
+                            + self.names.contact(
+                                normalize_number(sender), sender
+                            )
+                        )
+                sorter.add((msg_date, msg_type, body))
+        return sorters
+
+    def _iter_messages(self, start_timestamp, end_timestamp, bounded):
+        """Message elements that may fall within the timestamp range.
+
+        Uses the sparse index from the first scan to parse only the regions
+        of the file that can hold the range; otherwise scans everything.
+        """
+        if (
+            bounded
+            and self.sparse_index is not None
+            and self.sparse_index.is_current()
+        ):
+            return self.sparse_index.iter_elements(
+                start_timestamp, end_timestamp, MESSAGE_TAGS
+            )
+        return iter_elements(self.file_path, MESSAGE_TAGS)
@@ -0,0 +1,510 @@
+# engine.py
+"""Constant-memory streaming over one or more SMS Backup & Restore files.
+
+`StreamingEngine` runs several backups (e.g. `sms-*.xml` and `calls-*.xml`)
+in one coordinated pass: each file is read and parsed on background
+threads, every element is turned into a row by the handler registered for
+its tag, rows are processed in chunks, and progress is reported over the
+combined size.
+"""
+
+import logging
+import queue
+import re
+import threading
+import time
+import xml.etree.ElementTree as ET
+from xml.parsers import expat as pyexpat
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+NON_DIGITS = re.compile(r"\D")
+# Top-level message elements in an SMS backup
+MESSAGE_TAGS = ("sms", "mms")
+MESSAGE_START = re.compile(rb"<(?:sms|mms)[\s/>]")
+# MMS <addr> type for the sender (151 = to, 130 = cc)
+MMS_FROM = "137"
+# Bytes read from a backup at a time
+READ_SIZE = 64 * 1024
+# Whether parse_elements(timely=True) can yield each element with the chunk
+# that completes it: false only if expat defers large tokens and Python
+# can't flush them (XMLPullParser.flush arrived in 3.11.9 and 3.12.3)
+HAS_FLUSH = hasattr(ET.XMLPullParser, "flush")
+TIMELY_ELEMENTS = HAS_FLUSH or pyexpat.version_info < (2, 6, 0)
+# Seconds a stage blocks on a queue before checking for shutdown
+STAGE_POLL = 0.1
+
+
+def iter_elements(source, tags=("sms",), read_size=READ_SIZE):
+    """Yield top-level backup elements whose tag is in `tags`.
+
+    `source` is a path or a binary file object read `read_size` bytes at a
+    time. While an element is being handled, `source.tell()` is the end of
+    the read that completed it, so the element ends within the last
+    `read_size` bytes before that position.
+    """
+    if isinstance(source, (str, Path)):
+        with open(source, "rb") as f:
+            yield from iter_elements(f, tags, read_size)
+        return
+    yield from parse_elements(iter(lambda: source.read(read_size), b""), tags)
+
+
+def parse_elements(chunks, tags, fragment=False, timely=False):
+    """Yield top-level elements whose tag is in `tags` from byte chunks.
+
+    ET.iterparse keeps every parsed element attached to the root, so
+    clearing elements alone still leaves memory growing with message count.
+    Here each top-level element is detached from the root as soon as the
+    caller has seen it, keeping memory constant regardless of file size.
+
+    With `fragment`, the chunks are a slice of a backup starting at a
+    message boundary: they are wrapped in a synthetic root, and a truncated
+    element or stray markup at the end is ignored.
+
+    Expat 2.6+ defers parsing a large token (e.g. a multi-megabyte MMS
+    attachment) until more data arrives, so an element can be yielded a few
+    chunks after the one that completes it. With `timely`, the parser is
+    flushed after each chunk so that it isn't, which SparseIndex offsets
+    rely on; this re-parses large tokens as expat before 2.6 always did.
+    """
+    parser = ET.XMLPullParser(events=("start", "end"))
+    flush = getattr(parser, "flush", None)
+    if fragment:
+        parser.feed(b"<smses>")
+
+    def events():
+        for data in chunks:
+            parser.feed(data)
+            if timely and flush is not None:
+                flush()
+            yield from parser.read_events()
+        # Parse whatever expat deferred past the last chunk
+        if not fragment:
+            parser.close()
+        elif flush is not None:
+            flush()
+        yield from parser.read_events()
+
+    root = None
+    depth = 0
+    try:
+        for event, elem in events():
+            if event == "start":
+                if root is None:
+                    root = elem
+                depth += 1
+                continue
+            depth -= 1
+            if depth == 1:
+                if elem.tag in tags:
+                    yield elem
+                # Only the element just finished is attached here
+                root.clear()
+    except ET.ParseError:
+        if not fragment:
+            raise
+
+
+def find_message_start(data, pos=0):
+    """Offset of the first message tag in `data` at or after `pos`, or -1"""
+    match = MESSAGE_START.search(data, pos)
+    return match.start() if match else -1
+
+
+def normalize_number(address):
+    """Key used to join the same contact across SMS and call backups.
+
+    Numbers with a country code ("+", "00" or more than 10 digits) keep it,
+    so "+1 (555) 123-4567" and "15551234567" match as "+15551234567" while
+    "+49 170 1234567" stays "+491701234567". National forms drop their
+    formatting and trunk 0 and key on the local number, so they don't join
+    the international form of the same number. Short codes and alphanumeric
+    senders are kept as is.
+    """
+    if not address:
+        return ""
+    address = address.strip()
+    digits = NON_DIGITS.sub("", address)
+    if len(digits) < 7:
+        return address.lower()
+    if address.startswith("+"):
+        return "+" + digits
+    if digits.startswith("00"):
+        return "+" + digits[2:]
+    if digits.startswith("0"):
+        return digits[1:]
+    if len(digits) > 10:
+        return "+" + digits
+    return digits
+
+
+def thread_key(address):
+    """Canonical key for a thread's recipient set.
+
+    Group threads store several recipients in one `~`-separated address, in
+    no fixed order; sorting the normalized numbers makes every ordering of
+    the same group land on one key. One-to-one threads key on the number.
+    """
+    numbers = {normalize_number(part) for part in address.split("~")}
+    numbers.discard("")
+    return "~".join(sorted(numbers))
+
+
+def read_message(elem):
+    """(address, contact_name, date, msg_type, body, sender) for <sms>/<mms>.
+
+    `sender` is the MMS sender's address, or None when it isn't recorded.
+    """
+    if elem.tag == "sms":
+        return (
+            elem.get("address") or "",
+            elem.get("contact_name", ""),
+            int(elem.get("date", 0)),
+            "sent" if elem.get("type") == "2" else "received",
+            elem.get("body", ""),
+            None,
+        )
+
+    # MMS: recipients live in <addrs>, text in <parts>
+    sender = None
+    recipients = []
+    for addr in elem.iterfind("addrs/addr"):
+        number = addr.get("address")
+        if not number or number == "insert-address-token":
+            continue
+        if addr.get("type") == MMS_FROM:
+            sender = number
+        recipients.append(number)
+    body = "\n".join(
+        part.get("text", "")
+        for part in elem.iterfind("parts/part")
+        if part.get("ct") == "text/plain"
+    )
+    return (
+        elem.get("address") or "~".join(recipients),
+        elem.get("contact_name", ""),
+        int(elem.get("date", 0)),
+        "sent" if elem.get("msg_box") == "2" else "received",
+        body,
+        sender,
+    )
+
+
+class ElementHandler:
+    """Turns elements into rows and processes them in chunks.
+
+    `tags` is one tag or a tuple of them; elements of all of a handler's
+    tags share its chunks, so rows keep their order in the file.
+    """
+
+    def __init__(self, tags, extract, process):
+        self.tags = (tags,) if isinstance(tags, str) else tuple(tags)
+        self.extract = extract
+        self.process = process
+
+
+class StageMetrics:
+    """Throughput counters for one pipeline stage.
+
+    `busy` is time spent doing the stage's own work, `waiting` time spent
+    blocked on its neighbours: a stage that mostly waits is not the
+    bottleneck.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.bytes = 0
+        self.busy = 0.0
+        self.waiting = 0.0
+
+    def as_dict(self):
+        return {
+            "items": self.items,
+            "bytes": self.bytes,
+            "busy_seconds": round(self.busy, 3),
+            "wait_seconds": round(self.waiting, 3),
+            "items_per_second": self.items / self.busy if self.busy else 0.0,
+            "mb_per_second": (
+                self.bytes / (1024 * 1024 * self.busy) if self.busy else 0.0
+            ),
+        }
+
+
+class _Stopped(Exception):
+    """Raised inside a stage thread when the pipeline is shutting down"""
+
+
+def _put(q, item, stop, metrics):
+    started = time.perf_counter()
+    while True:
+        if stop.is_set():
+            raise _Stopped
+        try:
+            q.put(item, timeout=STAGE_POLL)
+            break
+        except queue.Full:
+            continue
+    metrics.waiting += time.perf_counter() - started
+
+
+def _get(q, stop, metrics):
+    started = time.perf_counter()
+    while True:
+        if stop.is_set():
+            raise _Stopped
+        try:
+            item = q.get(timeout=STAGE_POLL)
+            break
+        except queue.Empty:
+            continue
+    metrics.waiting += time.perf_counter() - started
+    return item
+
+
+class ReaderStage(threading.Thread):
+    """Reads one file sequentially into a fixed pool of reusable buffers.
+
+    Filled buffers are queued as (buffer, view, position) where `position`
+    is the file offset at the end of the read; the consumer hands each
+    buffer back with `release` once the parser has been fed from it.
+    """
+
+    def __init__(self, file_path, read_size, buffer_count, stop, metrics):
+        super().__init__(name=f"reader-{file_path.name}", daemon=True)
+        self.file_path = file_path
+        self.read_size = read_size
+        self.stop = stop
+        self.metrics = metrics
+        self.filled = queue.Queue(maxsize=buffer_count)
+        self.free = queue.Queue()
+        for _ in range(buffer_count):
+            self.free.put(bytearray(read_size))
+
+    def run(self):
+        try:
+            with open(self.file_path, "rb", buffering=0) as f:
+                position = 0
+                while True:
+                    buffer = _get(self.free, self.stop, self.metrics)
+                    started = time.perf_counter()
+                    n = f.readinto(buffer)
+                    self.metrics.busy += time.perf_counter() - started
+                    if not n:
+                        break
+                    position += n
+                    self.metrics.items += 1
+                    self.metrics.bytes += n
+                    view = memoryview(buffer)[:n]
+                    _put(
+                        self.filled,
+                        (buffer, view, position),
+                        self.stop,
+                        self.metrics,
+                    )
+            _put(self.filled, None, self.stop, self.metrics)
+        except _Stopped:
+            pass
+        except Exception as e:
+            try:
+                _put(self.filled, e, self.stop, self.metrics)
+            except _Stopped:
+                pass
+
+    def release(self, buffer, view):
+        view.release()
+        self.free.put(buffer)
+
+
+class StreamingEngine:
+    """Read, parse and aggregate backups as three overlapping stages.
+
+    A `ReaderStage` thread fills `buffer_count` buffers of `read_size` bytes
+    with sequential reads; a parser thread feeds them to the pull parser and
+    turns elements into rows, queueing up to `queue_depth` chunks of
+    `chunk_size` rows; the calling thread runs the handlers' `process` and
+    reports progress, so callbacks (e.g. Streamlit updates) stay on the
+    caller's thread. Per-stage throughput is kept in `metrics`.
+    """
+
+    def __init__(
+        self,
+        file_paths,
+        handlers,
+        chunk_size=1000,
+        read_size=READ_SIZE,
+        indexes=None,
+        buffer_count=4,
+        queue_depth=8,
+    ):
+        self.file_paths = [Path(p) for p in file_paths]
+        self.handlers = {
+            tag: handler for handler in handlers for tag in handler.tags
+        }
+        self.chunk_size = chunk_size
+        self.read_size = read_size
+        self.buffer_count = buffer_count
+        self.queue_depth = queue_depth
+        # Optional SparseIndex per file path, built during the run
+        self.indexes = {Path(p): index for p, index in (indexes or {}).items()}
+        self.total_size = sum(p.stat().st_size for p in self.file_paths)
+        self.counts = {tag: 0 for tag in self.handlers}
+        self.metrics = {
+            name: StageMetrics(name) for name in ("read", "parse", "aggregate")
+        }
+
+    def run(self, progress_callback=None, update_interval=1):
+        """Stream every file, reporting progress at most once per interval"""
+        start_time = time.time()
+        last_update = start_time
+        stop = threading.Event()
+        rows = queue.Queue(maxsize=self.queue_depth)
+        parser = threading.Thread(
+            target=self._parse_stage, args=(rows, stop), daemon=True
+        )
+        parser.start()
+
+        metrics = self.metrics["aggregate"]
+        try:
+            while True:
+                item = _get(rows, stop, metrics)
+                if item is None:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                handler, chunk, total_bytes = item
+                started = time.perf_counter()
+                handler.process(chunk)
+                metrics.busy += time.perf_counter() - started
+                metrics.items += len(chunk)
+
+                # Update progress based on time interval
+                current_time = time.time()
+                if (
+                    progress_callback
+                    and current_time - last_update >= update_interval
+                ):
+                    self._report(
+                        progress_callback,
+                        total_bytes,
+                        current_time - start_time,
+                    )
+                    last_update = current_time
+        finally:
+            stop.set()
+            parser.join()
+
+        for name, stage in self.metrics.items():
+            stats = stage.as_dict()
+            logger.info(
+                f"Stage {name}: {stats['items']:,} items, "
+                f"{stats['mb_per_second']:.1f} MB/s, "
+                f"{stats['items_per_second']:,.0f} items/s, "
+                f"busy {stats['busy_seconds']:.2f}s, "
+                f"waiting {stats['wait_seconds']:.2f}s"
+            )
+        return self.counts
+
+    def _parse_stage(self, rows, stop):
+        """Parser thread: buffers in, chunks of rows out"""
+        metrics = self.metrics["parse"]
+        try:
+            bytes_done = 0
+            for file_path in self.file_paths:
+                logger.info(f"Streaming {file_path}")
+                reader = ReaderStage(
+                    file_path,
+                    self.read_size,
+                    self.buffer_count,
+                    stop,
+                    self.metrics["read"],
+                )
+                reader.start()
+                self._parse_file(file_path, reader, bytes_done, rows, stop)
+                # On errors the reader is left to exit once `stop` is set
+                reader.join()
+                bytes_done += file_path.stat().st_size
+            _put(rows, None, stop, metrics)
+        except _Stopped:
+            pass
+        except Exception as e:
+            try:
+                _put(rows, e, stop, metrics)
+            except _Stopped:
+                pass
+
+    def _parse_file(self, file_path, reader, bytes_done, rows, stop):
+        metrics = self.metrics["parse"]
+        index = self.indexes.get(file_path)
+        position = 0
+
+        def buffers():
+            nonlocal position
+            while True:
+                item = _get(reader.filled, stop, metrics)
+                if item is None:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                buffer, view, position = item
+                metrics.bytes += len(view)
+                yield view
+                # The parser has consumed the view; reuse the buffer
+                reader.release(buffer, view)
+
+        chunks = {handler: [] for handler in self.handlers.values()}
+        counts = self.counts
+        started = time.perf_counter()
+        waited = metrics.waiting
+        for elem in parse_elements(
+            buffers(), tuple(self.handlers), timely=index is not None
+        ):
+            if index is not None:
+                index.observe(elem, position)
+            handler = self.handlers[elem.tag]
+            chunk = chunks[handler]
+            chunk.append(handler.extract(elem))
+            counts[elem.tag] += 1
+            metrics.items += 1
+            if len(chunk) >= self.chunk_size:
+                _put(
+                    rows,
+                    (handler, chunk, bytes_done + position),
+                    stop,
+                    metrics,
+                )
+                chunks[handler] = []
+
+        # Queue any remaining rows
+        for handler, chunk in chunks.items():
+            if chunk:
+                _put(
+                    rows,
+                    (handler, chunk, bytes_done + position),
+                    stop,
+                    metrics,
+                )
+        if index is not None:
+            index.finish()
+        metrics.busy += (
+            time.perf_counter() - started - (metrics.waiting - waited)
+        )
+
+    def _report(self, progress_callback, total_bytes, elapsed):
+        if elapsed <= 0:
+            return
+        speed = total_bytes / (1024 * 1024 * elapsed)
+        eta = (
+            (self.total_size - total_bytes) / (speed * 1024 * 1024)
+            if speed > 0
+            else 0
+        )
+        progress = min(total_bytes / self.total_size, 1.0)
+        logger.debug(
+            f"Progress: {progress:.1%}, Speed: {speed:.1f} MB/s, "
+            f"ETA: {eta:.0f}s, Rows processed: "
+            f"{self.metrics['aggregate'].items:,}"
+        )
+        progress_callback(progress, speed, eta)
@@ -0,0 +1,139 @@
+# exporter.py
+"""Bounded-memory helpers for writing exported conversations.
+
+Matching messages are collected into a `MessageSorter`, which keeps at most
+`max_rows` in memory and spills sorted runs to temporary files beyond that,
+then merges the runs back in timestamp order. Exports are written into
+spooled buffers that only touch disk once they outgrow `SPOOL_MAX_BYTES`.
+"""
+
+from contextlib import contextmanager
+import csv
+from datetime import datetime
+import heapq
+import io
+import pickle
+import tempfile
+import zipfile
+
+# Exports stay in memory up to this size before spilling to a temp file
+SPOOL_MAX_BYTES = 32 * 1024 * 1024
+# Messages held in memory per export before sorted runs are spilled
+SORT_BUFFER_ROWS = 100_000
+# Rows pickled together when spilling a run
+RUN_BATCH_ROWS = 1000
+
+MIME_TYPES = {"txt": "text/plain", "csv": "text/csv", "zip": "application/zip"}
+
+
+class MessageSorter:
+    """Sort (timestamp, type, body) rows using a bounded amount of memory"""
+
+    def __init__(self, max_rows=SORT_BUFFER_ROWS):
+        self.max_rows = max_rows
+        self.rows = []
+        self.runs = []
+        self.count = 0
+
+    def add(self, row):
+        self.rows.append(row)
+        self.count += 1
+        if len(self.rows) >= self.max_rows:
+            self._spill()
+
+    def _spill(self):
+        self.rows.sort(key=_timestamp)
+        run = tempfile.TemporaryFile()
+        for i in range(0, len(self.rows), RUN_BATCH_ROWS):
+            pickle.dump(self.rows[i : i + RUN_BATCH_ROWS], run)
+        run.seek(0)
+        self.runs.append(run)
+        self.rows = []
+
+    def __iter__(self):
+        """Yield rows in timestamp order, consuming the sorter"""
+        self.rows.sort(key=_timestamp)
+        if not self.runs:
+            yield from self.rows
+            return
+        try:
+            yield from heapq.merge(
+                *(_read_run(run) for run in self.runs),
+                self.rows,
+                key=_timestamp,
+            )
+        finally:
+            for run in self.runs:
+                run.close()
+
+
+def _timestamp(row):
+    return row[0]
+
+
+def _read_run(run):
+    while True:
+        try:
+            yield from pickle.load(run)
+        except EOFError:
+            return
+
+
+def conversation_filename(phone, start_date, end_date, output_format):
+    safe_phone = "".join(c if c.isalnum() else "_" for c in phone)
+    if start_date is None and end_date is None:
+        return f"conversation_{safe_phone}.{output_format}"
+    return f"conversation_{safe_phone}_{start_date}_{end_date}.{output_format}"
+
+
+def write_messages(f, messages, output_format):
+    """Write sorted (timestamp, type, body) rows to a text file object"""
+    if output_format == "txt":
+        for msg_date, msg_type, body in messages:
+            f.write(f"[{_format_timestamp(msg_date)}] {msg_type}: {body}\n")
+    else:  # CSV format
+        writer = csv.writer(f)
+        writer.writerow(["Timestamp", "Type", "Message"])
+        for msg_date, msg_type, body in messages:
+            writer.writerow([_format_timestamp(msg_date), msg_type, body])
+
+
+def _format_timestamp(msg_date):
+    return datetime.fromtimestamp(msg_date / 1000).strftime(
+        "%Y-%m-%d %H:%M:%S"
+    )
+
+
+def spooled_buffer():
+    return tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+
+
+def write_text_buffer(messages, output_format):
+    """Write rows into a spooled binary buffer, rewound for reading"""
+    buffer = spooled_buffer()
+    with _text_writer(buffer) as f:
+        write_messages(f, messages, output_format)
+    buffer.seek(0)
+    return buffer
+
+
+def write_zip_buffer(entries, output_format):
+    """Write {filename: rows} into a zip held in a spooled buffer"""
+    buffer = spooled_buffer()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zf:
+        for filename, messages in entries.items():
+            with zf.open(filename, "w") as entry, _text_writer(entry) as f:
+                write_messages(f, messages, output_format)
+    buffer.seek(0)
+    return buffer
+
+
+@contextmanager
+def _text_writer(raw):
+    """UTF-8 text view of a binary stream that leaves the stream open"""
+    f = io.TextIOWrapper(raw, encoding="utf-8", newline="")
+    try:
+        yield f
+    finally:
+        f.flush()
+        f.detach()
@@ -23,7 +23,7 @@ def get_default_download_dir():
 
 
 def find_sms_backups(directory=None):
-    """Find SMS backup files in the given directory"""
+    """Find SMS and call log backup files in the given directory"""
     if directory is None:
         directory = get_default_download_dir()
 
@@ -31,17 +31,37 @@ def find_sms_backups(directory=None):
     if not path.exists():
         return []
 
-    # Look for SMS backup files (common patterns)
-    backup_files = []
-    patterns = ["sms-*.xml", "SMS*.xml", "*backup*.xml"]
+    # Look for SMS and call log backup files (common patterns)
+    backup_files = set()
+    patterns = ["sms-*.xml", "SMS*.xml", "*backup*.xml", "calls-*.xml"]
     for pattern in patterns:
-        backup_files.extend(path.glob(pattern))
+        backup_files.update(path.glob(pattern))
+    backup_files = list(backup_files)
 
     # Sort by modification time, newest first
     backup_files.sort(key=lambda x: x.stat().st_mtime, reverse=True)
     return backup_files
 
 
+def find_vcards(directory=None):
+    """Find vCard contact exports (.vcf) in the given directory"""
+    if directory is None:
+        directory = get_default_download_dir()
+
+    path = Path(directory)
+    if not path.exists():
+        return []
+
+    vcards = list(path.glob("*.vcf"))
+    vcards.sort(key=lambda x: x.stat().st_mtime, reverse=True)
+    return vcards
+
+
+def is_call_log(path):
+    """Whether a backup file is a call log (calls-*.xml)"""
+    return Path(path).name.lower().startswith("calls")
+
+
 def open_file_location(path):
     """Open the file location in the system file explorer"""
     system = platform.system()
@@ -0,0 +1,157 @@
+# preview.py
+"""Approximate conversation counts from randomly sampled byte ranges.
+
+Reads a few hundred short ranges of the backup, resyncs each one to the
+next message boundary and scales the sampled counts up to the whole file.
+The result has the same shape as `ConversationAnalyzer.stream_conversations`
+so it can be charted immediately, with `count_low`/`count_high` giving a
+95% confidence range. Files no bigger than the sampled bytes are left to
+the exact scan, which reads them about as fast.
+"""
+
+import logging
+import math
+import random
+import time
+from collections import defaultdict
+from pathlib import Path
+from engine import (
+    MESSAGE_START,
+    MESSAGE_TAGS,
+    find_message_start,
+    parse_elements,
+    read_message,
+    thread_key,
+)
+
+logger = logging.getLogger(__name__)
+
+Z_95 = 1.96
+
+
+def estimate_conversations(
+    file_path, samples=300, range_size=32 * 1024, time_budget=1.0, seed=None
+):
+    """Estimate per-conversation message counts from sampled byte ranges.
+
+    Returns {} for files no bigger than `samples * range_size`.
+    """
+    file_path = Path(file_path)
+    file_size = file_path.stat().st_size
+    if file_size <= samples * range_size:
+        return {}
+    start_time = time.time()
+    rng = random.Random(seed)
+    offsets = sorted(
+        rng.randrange(file_size - range_size) for _ in range(samples)
+    )
+
+    ranges = []
+    starts_seen = 0
+    with open(file_path, "rb") as f:
+        for offset in offsets:
+            if time.time() - start_time > time_budget and len(ranges) > 1:
+                break
+            f.seek(offset)
+            data = f.read(range_size)
+            first = find_message_start(data)
+            if first < 0:
+                ranges.append({})
+                continue
+            starts_seen += len(MESSAGE_START.findall(data))
+
+            counts = {}
+            for elem in parse_elements(
+                [data[first:]], MESSAGE_TAGS, fragment=True
+            ):
+                address, contact_name, msg_date, msg_type, _, _ = read_message(
+                    elem
+                )
+                key = thread_key(address)
+                stats = counts.get(key)
+                if stats is None:
+                    stats = counts[key] = {
+                        "count": 0,
+                        "sent": 0,
+                        "contact_name": "",
+                        "address": address,
+                        "dates": [],
+                    }
+                stats["count"] += 1
+                stats["sent"] += msg_type == "sent"
+                stats["contact_name"] = stats["contact_name"] or contact_name
+                stats["dates"].append(msg_date)
+            ranges.append(counts)
+
+    sampled_bytes = len(ranges) * range_size
+    total_messages = starts_seen * file_size / sampled_bytes
+    conversations = _scale(ranges, total_messages)
+    logger.info(
+        f"Preview from {len(ranges)} ranges in {time.time() - start_time:.2f}s: "
+        f"~{total_messages:,.0f} messages, {len(conversations)} conversations"
+    )
+    return conversations
+
+
+def _scale(ranges, total_messages):
+    """Turn per-range counts into estimated totals with a 95% range.
+
+    Each range is treated as a cluster: messages within a range are
+    correlated (backups are written in date order), so the variance comes
+    from how much each range's share of a conversation differs.
+    """
+    per_range_total = [sum(s["count"] for s in r.values()) for r in ranges]
+    sampled = sum(per_range_total)
+    if not sampled:
+        return {}
+
+    merged = defaultdict(
+        lambda: {
+            "count": 0,
+            "sent": 0,
+            "contact_name": "",
+            "address": None,
+            "dates": [],
+        }
+    )
+    for counts in ranges:
+        for key, stats in counts.items():
+            conv = merged[key]
+            conv["address"] = conv["address"] or stats["address"]
+            conv["count"] += stats["count"]
+            conv["sent"] += stats["sent"]
+            conv["contact_name"] = (
+                conv["contact_name"] or stats["contact_name"]
+            )
+            conv["dates"].extend(stats["dates"])
+
+    m = len(ranges)
+    mean_total = sampled / m
+    conversations = {}
+    for key, stats in merged.items():
+        share = stats["count"] / sampled
+        if m < 2:
+            margin = 0.0
+        else:
+            residuals = sum(
+                (counts.get(key, {}).get("count", 0) - share * n) ** 2
+                for counts, n in zip(ranges, per_range_total)
+            )
+            se = math.sqrt(residuals / (m * (m - 1))) / mean_total
+            margin = Z_95 * se * total_messages
+        count = share * total_messages
+        sent = count * stats["sent"] / stats["count"]
+        conversations[key] = {
+            "count": round(count),
+            "sent": round(sent),
+            "received": round(count - sent),
+            "contact_name": stats["contact_name"] or "(Unknown)",
+            "first_date": min(stats["dates"]),
+            "last_date": max(stats["dates"]),
+            "address": stats["address"],
+            "participants": key.split("~"),
+            "count_low": max(0, math.floor(count - margin)),
+            "count_high": math.ceil(count + margin),
+            "estimated": True,
+        }
+    return conversations
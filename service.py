@@ -0,0 +1,418 @@
+# service.py
+"""Local HTTP/JSON service that shares warm analyses between clients.
+
+Summary and export jobs are queued onto a bounded worker pool. Concurrent
+requests for the same work are merged into a single job, and a finished
+summary keeps its analyzer warm so later jobs on the same file reuse it.
+
+Endpoints:
+    POST /jobs                 {"kind": "summary"|"export", "file": ..., ...}
+    GET  /jobs/<id>            job status
+    GET  /jobs/<id>/events     newline-delimited JSON progress stream
+    GET  /jobs/<id>/result     summary JSON or exported file
+
+Run with:
+    python service.py --port 8765 --workers 2
+"""
+
+import argparse
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import logging
+from pathlib import Path
+import shutil
+import tempfile
+import threading
+import urllib.request
+import uuid
+
+from conversation import ConversationAnalyzer
+
+logger = logging.getLogger(__name__)
+
+JOB_KINDS = ("summary", "export")
+EXPORT_CONTENT_TYPES = {"txt": "text/plain", "csv": "text/csv"}
+
+
+class JobError(Exception):
+    """Raised for invalid job requests"""
+
+
+class Job:
+    """A unit of work whose progress can be watched by several clients"""
+
+    def __init__(self, kind, key, params):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.key = key
+        self.params = params
+        self.status = "queued"
+        self.progress = 0.0
+        self.speed = 0.0
+        self.eta = 0.0
+        self.error = None
+        self.result = None
+        self.version = 0
+        self._changed = threading.Condition()
+
+    @property
+    def finished(self):
+        return self.status in ("done", "failed")
+
+    def update(self, **fields):
+        with self._changed:
+            for name, value in fields.items():
+                setattr(self, name, value)
+            self.version += 1
+            self._changed.notify_all()
+
+    def wait_for_change(self, version, timeout=None):
+        """Block until the job changes past `version` or finishes"""
+        with self._changed:
+            self._changed.wait_for(
+                lambda: self.version > version or self.finished, timeout
+            )
+            return self.version
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "progress": self.progress,
+            "speed": self.speed,
+            "eta": self.eta,
+            "error": self.error,
+            "params": self.params,
+        }
+
+
+class JobManager:
+    """Queues jobs on a bounded pool and merges duplicate requests"""
+
+    def __init__(
+        self, workers=2, max_pending=32, max_finished=256, max_analyzers=4
+    ):
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="sms-slicer-job"
+        )
+        self.max_pending = max_pending
+        self.max_finished = max_finished
+        self.max_analyzers = max_analyzers
+        self.jobs = OrderedDict()
+        self.jobs_by_key = {}
+        # Warm analyzers by file key, least recently used first
+        self.analyzers = OrderedDict()
+        self.export_dir = Path(tempfile.mkdtemp(prefix="sms-slicer-"))
+        self._lock = threading.Lock()
+
+    def submit(self, request):
+        """Create a job for `request`, or return an equivalent one"""
+        if not isinstance(request, dict):
+            raise JobError("Request body must be a JSON object")
+        kind = request.get("kind")
+        if kind not in JOB_KINDS:
+            raise JobError(f"Unknown job kind: {kind!r}")
+        file_key = self._file_key(request.get("file"))
+        params = self._params(kind, request)
+        key = (kind, file_key, tuple(sorted(params.items())))
+
+        with self._lock:
+            existing = self.jobs_by_key.get(key)
+            if existing is not None and existing.status != "failed":
+                logger.info(f"Merging {kind} request into job {existing.id}")
+                return existing
+
+            pending = sum(1 for job in self.jobs.values() if not job.finished)
+            if pending >= self.max_pending:
+                raise JobError("Too many pending jobs, try again later")
+
+            job = Job(kind, key, {"file": file_key[0], **params})
+            self.jobs[job.id] = job
+            self.jobs_by_key[key] = job
+            self._evict_finished()
+
+        runner = self._run_summary if kind == "summary" else self._run_export
+        self.executor.submit(self._run, job, runner, file_key)
+        logger.info(f"Queued {kind} job {job.id} for {file_key[0]}")
+        return job
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        shutil.rmtree(self.export_dir, ignore_errors=True)
+
+    def _file_key(self, file_path):
+        """Identify a file by path and on-disk state so edits start fresh"""
+        if not file_path:
+            raise JobError("Missing 'file'")
+        if not isinstance(file_path, str):
+            raise JobError("'file' must be a string")
+        path = Path(file_path).expanduser().resolve()
+        if not path.is_file():
+            raise JobError(f"File not found: {file_path}")
+        stat = path.stat()
+        return (str(path), stat.st_mtime_ns, stat.st_size)
+
+    def _params(self, kind, request):
+        if kind == "summary":
+            return {}
+        try:
+            params = {
+                "phone": request["phone"],
+                "start_date": date.fromisoformat(
+                    request["start_date"]
+                ).isoformat(),
+                "end_date": date.fromisoformat(
+                    request["end_date"]
+                ).isoformat(),
+                "format": request.get("format", "txt"),
+            }
+        except (KeyError, TypeError, ValueError) as e:
+            raise JobError(f"Invalid export request: {e}")
+        if not isinstance(params["phone"], str) or not params["phone"]:
+            raise JobError("'phone' must be a non-empty string")
+        if not isinstance(params["format"], str) or (
+            params["format"] not in EXPORT_CONTENT_TYPES
+        ):
+            raise JobError(f"Unknown export format: {params['format']!r}")
+        return params
+
+    def _evict_finished(self):
+        finished = [job for job in self.jobs.values() if job.finished]
+        for job in finished[: max(0, len(finished) - self.max_finished)]:
+            del self.jobs[job.id]
+            if self.jobs_by_key.get(job.key) is job:
+                del self.jobs_by_key[job.key]
+            if job.kind == "export" and job.result is not None:
+                Path(job.result).unlink(missing_ok=True)
+
+    def _analyzer(self, file_key):
+        """The warm analyzer for a file, or a fresh one"""
+        with self._lock:
+            analyzer = self.analyzers.get(file_key)
+            if analyzer is not None:
+                self.analyzers.move_to_end(file_key)
+                return analyzer
+        return ConversationAnalyzer(file_key[0])
+
+    def _keep_warm(self, file_key, analyzer):
+        """Keep a scanned analyzer, dropping stale and least recent ones"""
+        with self._lock:
+            for key in list(self.analyzers):
+                # Older versions of the same file can't be asked for again
+                if key[0] == file_key[0] and key != file_key:
+                    del self.analyzers[key]
+            self.analyzers[file_key] = analyzer
+            self.analyzers.move_to_end(file_key)
+            while len(self.analyzers) > self.max_analyzers:
+                evicted, _ = self.analyzers.popitem(last=False)
+                logger.info(f"Evicted warm analyzer for {evicted[0]}")
+
+    def _run(self, job, runner, file_key):
+        job.update(status="running")
+        try:
+            result = runner(job, file_key)
+        except Exception as e:
+            logger.error(f"Job {job.id} failed: {str(e)}", exc_info=True)
+            job.update(status="failed", error=str(e))
+        else:
+            job.update(status="done", progress=1.0, eta=0.0, result=result)
+
+    def _run_summary(self, job, file_key):
+        # A warm analyzer returns its cached summary without rescanning
+        analyzer = self._analyzer(file_key)
+
+        def update_progress(progress, speed, eta, conversations):
+            job.update(progress=progress, speed=speed, eta=eta)
+
+        conversations = analyzer.stream_conversations(update_progress)
+        self._keep_warm(file_key, analyzer)
+        return conversations
+
+    def _run_export(self, job, file_key):
+        params = job.params
+        output_path = self.export_dir / f"{job.id}.{params['format']}"
+        return self._analyzer(file_key).export_conversation(
+            params["phone"],
+            date.fromisoformat(params["start_date"]),
+            date.fromisoformat(params["end_date"]),
+            params["format"],
+            output_path=output_path,
+        )
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    manager = None
+
+    def do_POST(self):
+        if self.path.rstrip("/") != "/jobs":
+            return self._send_json({"error": "Not found"}, 404)
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            job = self.manager.submit(request)
+        except (JobError, ValueError) as e:
+            return self._send_json({"error": str(e)}, 400)
+        self._send_json(job.to_dict(), 202)
+
+    def do_GET(self):
+        parts = self.path.strip("/").split("/")
+        if len(parts) not in (2, 3) or parts[0] != "jobs":
+            return self._send_json({"error": "Not found"}, 404)
+        job = self.manager.get(parts[1])
+        if job is None:
+            return self._send_json({"error": "Unknown job"}, 404)
+
+        action = parts[2] if len(parts) == 3 else None
+        if action is None:
+            self._send_json(job.to_dict())
+        elif action == "events":
+            self._stream_events(job)
+        elif action == "result":
+            self._send_result(job)
+        else:
+            self._send_json({"error": "Not found"}, 404)
+
+    def _stream_events(self, job):
+        """Write one JSON line per progress change until the job finishes"""
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        version = -1
+        while True:
+            version = job.wait_for_change(version, timeout=15)
+            self.wfile.write(json.dumps(job.to_dict()).encode() + b"\n")
+            self.wfile.flush()
+            if job.finished:
+                return
+
+    def _send_result(self, job):
+        if job.status == "failed":
+            return self._send_json({"error": job.error}, 500)
+        if not job.finished:
+            return self._send_json(job.to_dict(), 409)
+        if job.kind == "summary":
+            return self._send_json(job.result)
+
+        path = Path(job.result)
+        self.send_response(200)
+        self.send_header(
+            "Content-Type", EXPORT_CONTENT_TYPES[job.params["format"]]
+        )
+        self.send_header("Content-Length", str(path.stat().st_size))
+        self.send_header(
+            "Content-Disposition", f'attachment; filename="{path.name}"'
+        )
+        self.end_headers()
+        with open(path, "rb") as f:
+            shutil.copyfileobj(f, self.wfile)
+
+    def _send_json(self, data, status=200):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} - {format % args}")
+
+
+class ServiceClient:
+    """Minimal client for scripts and other tools sharing the service"""
+
+    def __init__(self, url="http://127.0.0.1:8765"):
+        self.url = url.rstrip("/")
+
+    def submit(self, kind, file_path, **params):
+        request = {"kind": kind, "file": str(file_path), **params}
+        return self._request(
+            "/jobs", data=json.dumps(request).encode(), method="POST"
+        )
+
+    def status(self, job_id):
+        return self._request(f"/jobs/{job_id}")
+
+    def events(self, job_id):
+        """Yield job status dicts as progress is reported"""
+        with urllib.request.urlopen(
+            f"{self.url}/jobs/{job_id}/events"
+        ) as response:
+            for line in response:
+                yield json.loads(line)
+
+    def result(self, job_id):
+        """Summary jobs return a dict, export jobs return file bytes"""
+        with urllib.request.urlopen(
+            f"{self.url}/jobs/{job_id}/result"
+        ) as response:
+            body = response.read()
+            if response.headers.get_content_type() == "application/json":
+                return json.loads(body)
+            return body
+
+    def wait(self, job_id, progress_callback=None):
+        """Follow a job to completion and return its result"""
+        for event in self.events(job_id):
+            if progress_callback:
+                progress_callback(event)
+            if event["status"] == "failed":
+                raise RuntimeError(event["error"])
+        return self.result(job_id)
+
+    def _request(self, path, data=None, method="GET"):
+        request = urllib.request.Request(
+            f"{self.url}{path}",
+            data=data,
+            method=method,
+            headers={"Content-Type": "application/json"},
+        )
+        with urllib.request.urlopen(request) as response:
+            return json.loads(response.read())
+
+
+def serve(host="127.0.0.1", port=8765, workers=2, max_analyzers=4):
+    manager = JobManager(workers=workers, max_analyzers=max_analyzers)
+    handler = type("Handler", (ServiceHandler,), {"manager": manager})
+    server = ThreadingHTTPServer((host, port), handler)
+    logger.info(f"SMS Slicer service listening on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        manager.shutdown()
+
+
+if __name__ == "__main__":
+    from logging_config import setup_logging
+
+    parser = argparse.ArgumentParser(
+        description="Run SMS Slicer as a local HTTP service"
+    )
+    parser.add_argument("--host", default="127.0.0.1", help="Bind address")
+    parser.add_argument("--port", type=int, default=8765, help="Port")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=2,
+        help="Maximum number of jobs running at once",
+    )
+    parser.add_argument(
+        "--max-analyzers",
+        type=int,
+        default=4,
+        help="Backups whose scanned analysis is kept warm in memory",
+    )
+
+    args = parser.parse_args()
+    setup_logging()
+    serve(args.host, args.port, args.workers, args.max_analyzers)
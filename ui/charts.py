@@ -15,17 +15,29 @@ def create_conversation_chart(conversations, on_select):
 
     # Convert conversations to DataFrame
     data = []
+    estimated = False
+    has_calls = False
     for phone, stats in conversations.items():
-        data.append(
-            {
-                "contact": f"{stats['contact_name']} ({phone})",
-                "messages": stats["count"],
-                "date_range": f"{format_date(stats['first_date'])} to {format_date(stats['last_date'])}",
-                "phone": phone,
-            }
-        )
+        row = {
+            "contact": f"{stats['contact_name']} ({stats.get('address') or phone})",
+            "messages": stats["count"],
+            "date_range": f"{format_date(stats['first_date'])} to {format_date(stats['last_date'])}",
+            "phone": phone,
+        }
+        if "calls" in stats:
+            has_calls = True
+            row["calls"] = stats["calls"]
+        if stats.get("estimated"):
+            estimated = True
+            row["estimate"] = (
+                f"~{stats['count']:,} "
+                f"({stats['count_low']:,}-{stats['count_high']:,})"
+            )
+        data.append(row)
 
     df = pd.DataFrame(data)
+    if has_calls:
+        df["calls"] = df["calls"].fillna(0).astype(int)
     df = df.sort_values("messages", ascending=True).tail(20)  # Show top 20
 
     # Create interactive chart
@@ -35,7 +47,11 @@ def create_conversation_chart(conversations, on_select):
         .encode(
             x=alt.X("messages:Q", title="Number of Messages"),
             y=alt.Y("contact:N", title=None, sort="-x"),
-            tooltip=["contact", "messages", "date_range"],
+            tooltip=(
+                ["contact", "estimate" if estimated else "messages"]
+                + (["calls"] if has_calls else [])
+                + ["date_range"]
+            ),
             color=alt.value("#1f77b4"),
         )
         .properties(
@@ -58,3 +74,96 @@ def create_conversation_chart(conversations, on_select):
 
     # Return the data for selection handling
     return df
+
+
+def create_activity_heatmap(summary):
+    """Hour-of-week heatmap for a single conversation's analytics"""
+    from analytics import DAY_NAMES
+
+    df = pd.DataFrame(
+        {
+            "day": [DAY_NAMES[i // 24] for i in range(168)],
+            "hour": [i % 24 for i in range(168)],
+            "messages": summary["hour_of_week"],
+        }
+    )
+    chart = (
+        alt.Chart(df)
+        .mark_rect()
+        .encode(
+            x=alt.X("hour:O", title="Hour"),
+            y=alt.Y("day:O", title=None, sort=DAY_NAMES),
+            color=alt.Color("messages:Q", title="Messages"),
+            tooltip=["day", "hour", "messages"],
+        )
+        .properties(title="Activity by hour of week")
+    )
+    st.altair_chart(chart, use_container_width=True)
+
+
+def create_length_chart(summary):
+    """Message length distribution for a single conversation's analytics"""
+    from analytics import LENGTH_LABELS
+
+    df = pd.DataFrame(
+        {"length": LENGTH_LABELS, "messages": summary["length_bins"]}
+    )
+    chart = (
+        alt.Chart(df)
+        .mark_bar()
+        .encode(
+            x=alt.X("length:N", title="Characters", sort=LENGTH_LABELS),
+            y=alt.Y("messages:Q", title="Messages"),
+            tooltip=["length", "messages"],
+            color=alt.value("#1f77b4"),
+        )
+        .properties(title="Message length")
+    )
+    st.altair_chart(chart, use_container_width=True)
+
+
+def format_duration(seconds):
+    if seconds is None:
+        return "n/a"
+    if seconds < 60:
+        return f"{seconds:.0f}s"
+    if seconds < 3600:
+        return f"{seconds / 60:.0f}m"
+    if seconds < 86400:
+        return f"{seconds / 3600:.1f}h"
+    return f"{seconds / 86400:.1f}d"
+
+
+def show_conversation_analytics(summary):
+    """Show reply times, streaks and activity charts for a conversation"""
+    if not summary:
+        return
+
+    col1, col2, col3 = st.columns(3)
+    col1.metric(
+        "Your median reply", format_duration(summary["median_reply_sent"])
+    )
+    col2.metric(
+        "Their median reply",
+        format_duration(summary["median_reply_received"]),
+    )
+    col3.metric(
+        "Longest streak",
+        f"{summary['longest_streak']} days",
+        help=f"Starting {summary['longest_streak_start']}",
+    )
+    from analytics import OUT_OF_ORDER_LIMIT
+
+    messages = sum(summary["hour_of_week"])
+    if summary["out_of_order"] > OUT_OF_ORDER_LIMIT * messages:
+        st.caption(
+            f"Reply times aren't shown: {summary['out_of_order']:,} "
+            "messages in this conversation are out of date order in the "
+            "backup."
+        )
+
+    heatmap_col, length_col = st.columns([2, 1])
+    with heatmap_col:
+        create_activity_heatmap(summary)
+    with length_col:
+        create_length_chart(summary)
@@ -1,22 +1,43 @@
 import streamlit as st
 from datetime import datetime
-from file_handler import open_file_location
+from exporter import MIME_TYPES, conversation_filename
 import logging
-import os
-from pathlib import Path
 
 logger = logging.getLogger(__name__)
 
+# Downloads are built in memory; warn before exports this large
+LARGE_EXPORT_MESSAGES = 500_000
+
 
 def show_export_ui(conversations, conversation_df):
     """Handle the export UI and functionality"""
     st.subheader("Select Conversation to Export")
 
-    # Show stats
+    # Show stats; contacts only found in the call log have no messages
+    call_only = {k: v for k, v in conversations.items() if not v["count"]}
     total_messages = sum(conv["count"] for conv in conversations.values())
     st.write(
-        f"Found {len(conversations):,} conversations with {total_messages:,} total messages"
+        f"Found {len(conversations) - len(call_only):,} conversations with {total_messages:,} total messages"
     )
+    if call_only:
+        with st.expander(
+            f"{len(call_only):,} contacts with calls but no messages"
+        ):
+            st.dataframe(
+                [
+                    {
+                        "contact": stats["contact_name"],
+                        "number": stats["address"],
+                        "calls": stats["calls"],
+                        "minutes": round(stats["call_duration"] / 60, 1),
+                        "missed": stats["missed_calls"],
+                    }
+                    for stats in sorted(
+                        call_only.values(), key=lambda s: -s["calls"]
+                    )
+                ],
+                hide_index=True,
+            )
 
     # Sort contacts by message count
     conversation_df_sorted = conversation_df.sort_values(
@@ -37,12 +58,33 @@ def show_export_ui(conversations, conversation_df):
         "phone"
     ].iloc[0]
     stats = conversations[phone]
+    analyzer = st.session_state.analyzer
 
     # Show conversation stats
     st.write(
         f"Selected conversation: {stats['count']:,} messages "
         f"({stats['sent']:,} sent, {stats['received']:,} received)"
     )
+    if "~" not in phone:
+        groups = [k for k in analyzer.threads_with(phone) if k != phone]
+        if groups:
+            st.caption(
+                f"Also in {len(groups):,} group thread(s): "
+                + "; ".join(conversations[k]["contact_name"] for k in groups)
+            )
+    if stats.get("calls"):
+        st.write(
+            f"Calls with this contact: {stats['calls']:,} "
+            f"({stats['call_duration'] / 60:,.0f} min, "
+            f"{stats['missed_calls']:,} missed)"
+        )
+
+    # Conversation analytics (computed once per analyzer and cached)
+    if analyzer.activity is not None:
+        from ui.charts import show_conversation_analytics
+
+        with st.expander("Conversation analytics", expanded=False):
+            show_conversation_analytics(analyzer.get_analytics().get(phone))
 
     # Date range selection
     st.subheader("Select Date Range")
@@ -74,7 +116,7 @@ def show_export_ui(conversations, conversation_df):
 
     # Export options
     st.subheader("Export Options")
-    format_col, path_col = st.columns([1, 2])
+    format_col, download_col = st.columns([1, 2])
     with format_col:
         output_format = st.radio(
             "Format",
@@ -82,49 +124,90 @@ def show_export_ui(conversations, conversation_df):
             help="TXT: Human readable\nCSV: Spreadsheet compatible",
         )
 
-    # Export location selection
-    safe_phone = "".join(c if c.isalnum() else "_" for c in phone)
-    default_filename = (
-        f"conversation_{safe_phone}_{start_date}_{end_date}.{output_format}"
-    )
-
-    # Default to Downloads folder
-    default_dir = os.path.join(os.path.expanduser("~"), "Downloads")
-    default_path = os.path.join(default_dir, default_filename)
+    if stats["count"] > LARGE_EXPORT_MESSAGES:
+        _warn_large_export(stats["count"])
+
+    # The export runs when the button is clicked and streams into a spooled
+    # buffer, so nothing is written to the server's filesystem
+    with download_col:
+        st.write("")  # Spacing to align with the format options
+        st.download_button(
+            "Download Conversation",
+            data=_deferred_export(
+                lambda: analyzer.export_conversation_buffer(
+                    phone, start_date, end_date, output_format
+                )
+            ),
+            file_name=conversation_filename(
+                phone, start_date, end_date, output_format
+            ),
+            mime=MIME_TYPES[output_format],
+            on_click="ignore",
+        )
 
-    with path_col:
-        export_path = st.text_input(
-            "Export location",
-            value=default_path,
-            help="Full path where the file will be saved",
+    # Several conversations bundled into one zip
+    st.subheader("Export Several Conversations")
+    bundle = st.multiselect(
+        "Conversations to bundle",
+        contact_list,
+        format_func=lambda x: x.split("(")[0].strip(),
+    )
+    if bundle:
+        phones = conversation_df[conversation_df["contact"].isin(bundle)][
+            "phone"
+        ].tolist()
+        use_range = st.checkbox(
+            f"Only messages from {start_date} to {end_date}",
+            help="Applies the date range selected above to every "
+            "conversation in the bundle",
+        )
+        if use_range:
+            bundle_start, bundle_end = start_date, end_date
+            bundle_name = f"conversations_{start_date}_{end_date}"
+        else:
+            st.caption("Each conversation's full history is included.")
+            bundle_start = bundle_end = None
+            bundle_name = "conversations"
+        bundle_messages = sum(conversations[p]["count"] for p in phones)
+        if bundle_messages > LARGE_EXPORT_MESSAGES:
+            _warn_large_export(bundle_messages)
+        st.download_button(
+            f"Download {len(phones)} Conversations (.zip)",
+            data=_deferred_export(
+                lambda: analyzer.export_conversations_zip(
+                    phones, bundle_start, bundle_end, output_format
+                )
+            ),
+            file_name=f"{bundle_name}_{output_format}.zip",
+            mime=MIME_TYPES["zip"],
+            on_click="ignore",
         )
 
-        # Create parent directory if it doesn't exist
-        Path(os.path.dirname(export_path)).mkdir(parents=True, exist_ok=True)
 
-    col1, col2 = st.columns([1, 1])
-    with col1:
-        if st.button("Export Conversation"):
-            try:
-                with st.spinner("Exporting..."):
-                    output_path = (
-                        st.session_state.analyzer.export_conversation(
-                            phone,
-                            start_date,
-                            end_date,
-                            output_format,
-                            output_path=export_path,
-                        )
-                    )
-                    st.success(f"Exported to: {output_path}")
-                    logger.info(
-                        f"Successfully exported conversation to {output_path}"
-                    )
-            except Exception as e:
-                logger.error(f"Export failed: {str(e)}", exc_info=True)
-                st.error(f"Failed to export: {str(e)}")
+def _warn_large_export(messages):
+    st.warning(
+        f"This export covers {messages:,} messages and is built in memory "
+        "when downloaded. For very large exports, use "
+        "`ConversationAnalyzer.export_conversation` or the local service "
+        "(`python service.py`), which write to disk."
+    )
 
-    with col2:
-        if os.path.exists(export_path):
-            if st.button("Show in Finder"):
-                open_file_location(export_path)
+
+def _deferred_export(export):
+    """Wrap an export so it runs on click and logs failures"""
+
+    def run():
+        try:
+            # Streamlit serves downloads from bytes it holds itself, so the
+            # spooled buffer is read once here and released. Memory for the
+            # download therefore grows with the export's size; large
+            # exports are flagged with _warn_large_export.
+            with export() as buffer:
+                data = buffer.read()
+            logger.info(f"Export generated for download ({len(data):,} bytes)")
+            return data
+        except Exception as e:
+            logger.error(f"Export failed: {str(e)}", exc_info=True)
+            raise
+
+    return run
@@ -1,8 +1,13 @@
 import streamlit as st
 from pathlib import Path
 import platform
-from file_handler import find_sms_backups, open_file_location, validate_file
-from sample_data import generate_sample_data
+from file_handler import (
+    find_sms_backups,
+    find_vcards,
+    is_call_log,
+    open_file_location,
+    validate_file,
+)
 
 
 def show_file_selector():
@@ -10,6 +15,8 @@ def show_file_selector():
     # Initialize session state
     if "file_path" not in st.session_state:
         st.session_state.file_path = None
+    st.session_state.call_log_path = None
+    st.session_state.contacts_path = None
 
     # Add option to use sample data
     use_sample = st.checkbox(
@@ -27,6 +34,9 @@ def show_file_selector():
             )
             if st.button("Generate Sample Data"):
                 try:
+                    # Imported on demand: pulls in faker and names
+                    from sample_data import generate_sample_data
+
                     generate_sample_data.create_sample_backup()
                     st.success(
                         "Sample data generated! Please reload the page."
@@ -37,12 +47,14 @@ def show_file_selector():
     else:
         # Look for backup files in Downloads
         backup_files = find_sms_backups()
+        sms_files = [f for f in backup_files if not is_call_log(f)]
+        call_logs = [f for f in backup_files if is_call_log(f)]
 
         col1, col2 = st.columns([2, 1])
         with col1:
-            if backup_files:
+            if sms_files:
                 # Show dropdown of found backup files
-                file_options = {str(f): f.name for f in backup_files}
+                file_options = {str(f): f.name for f in sms_files}
                 selected_file = st.selectbox(
                     "Select SMS backup file",
                     options=list(file_options.keys()),
@@ -69,6 +81,36 @@ def show_file_selector():
                 if st.session_state.file_path:
                     open_file_location(st.session_state.file_path)
 
+        # Optional call log, streamed alongside the SMS backup
+        if call_logs:
+            call_options = {"": "None", **{str(f): f.name for f in call_logs}}
+            call_log_path = st.selectbox(
+                "Call log (optional)",
+                options=list(call_options.keys()),
+                format_func=lambda x: call_options[x],
+                help="Adds call volume next to message volume per contact",
+            )
+            if call_log_path:
+                valid, result = validate_file(call_log_path)
+                if valid:
+                    st.session_state.call_log_path = str(result)
+                else:
+                    st.error(result)
+
+        # Optional vCard export, used to name contacts
+        vcards = find_vcards()
+        if vcards:
+            vcard_options = {"": "None", **{str(f): f.name for f in vcards}}
+            st.session_state.contacts_path = (
+                st.selectbox(
+                    "Contacts (optional)",
+                    options=list(vcard_options.keys()),
+                    format_func=lambda x: vcard_options[x],
+                    help="Names contacts from a .vcf export",
+                )
+                or None
+            )
+
     # Validate and return file path
     if st.session_state.file_path:
         valid, result = validate_file(st.session_state.file_path)
@@ -17,18 +17,39 @@ def show_processor(file_path):
     if not st.session_state.processing_started:
         if st.button("Process SMS Backup", key="process_button"):
             st.session_state.processing_started = True
-            st.session_state.analyzer = ConversationAnalyzer(file_path)
+            st.session_state.analyzer = ConversationAnalyzer(
+                file_path,
+                call_log_path=st.session_state.get("call_log_path"),
+                contacts_path=st.session_state.get("contacts_path"),
+            )
             st.rerun()
         return None
 
     # If processing has started, show progress
     if st.session_state.analyzer is None:
-        st.session_state.analyzer = ConversationAnalyzer(file_path)
+        st.session_state.analyzer = ConversationAnalyzer(
+            file_path,
+            call_log_path=st.session_state.get("call_log_path"),
+            contacts_path=st.session_state.get("contacts_path"),
+        )
 
     progress_bar = st.progress(0.0)
     status_text = st.empty()
     chart_container = st.empty()
 
+    # Show an estimate right away; the exact scan replaces it as it arrives
+    preview = (
+        st.session_state.analyzer.preview_conversations()
+        if st.session_state.analyzer.result is None
+        else None
+    )
+    if preview:
+        status_text.text("Estimated from sampled ranges, refining...")
+        with chart_container:
+            from ui.charts import create_conversation_chart
+
+            create_conversation_chart(preview, None)
+
     def update_progress(progress, speed, eta, conversations):
         try:
             progress_bar.progress(float(progress))